@@ -1,22 +1,213 @@
 import logging
-from typing import List, Dict, Callable
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from typing import Iterable, List, Dict, Callable, FrozenSet
 
 from telegram import Update
+from telegram.ext import CallbackContext, DispatcherHandlerStop
+
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+RATE_LIMIT = 1.0
+RATE_BURST = 10
+DENIAL_REPLY_INTERVAL = 60
+MAX_TRACKED_USERS = 10000
+
+
+class TokenBucket(object):
+    """
+    Simple token bucket for rate limiting.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """
+        Initialize an object of class TokenBucket.
+
+        :param rate: Tokens added per second.
+        :param burst: Maximum number of tokens.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.timestamp = time.monotonic()
+
+    def consume(self) -> bool:
+        """
+        Takes one token from the bucket.
+
+        :return: True if a token was available, otherwise False.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
 
 
 class AccessManager(object):
-    __valid_users = []
+    __valid_users = {}
+    __buckets = OrderedDict()
+    __denials = OrderedDict()
+    __limit_notices = OrderedDict()
+    __lock = Lock()
+
+    @staticmethod
+    def normalize_user_id(user_id: object) -> int:
+        """
+        Normalizes a user id from the configuration or telegram.
+
+        :param user_id: User id as number or string.
+        :return: User id as integer.
+        """
+        return int(str(user_id).strip())
+
+    @classmethod
+    def __normalize_users(cls, users: Iterable) -> FrozenSet[int]:
+        """
+        Normalizes user ids, invalid ids are skipped.
+
+        :param users: List with user ids.
+        :return: Set with normalized user ids.
+        """
+        result = set()
+        for user in users:
+            try:
+                result.add(cls.normalize_user_id(user))
+            except ValueError:
+                logger.error('AccessManager: Invalid user id "{}"'.format(user))
+        return frozenset(result)
 
     @classmethod
-    def add_users(cls, users: List) -> None:
+    def add_users(cls, users: List, tenant: str = None) -> None:
         """
         Adds new users to the list with valid users.
 
         :param users: List with user ids.
+        :param tenant: Name of the tenant the users belong to, default is None.
+        """
+        with cls.__lock:
+            valid_users = dict(cls.__valid_users)
+            valid_users[tenant] = valid_users.get(tenant, frozenset()) | cls.__normalize_users(users)
+            cls.__valid_users = valid_users
+
+    @classmethod
+    def set_users(cls, users: List, tenant: str = None) -> None:
+        """
+        Replaces the valid users of a tenant atomically, e.g. after reloading the configuration.
+
+        :param users: List with user ids.
+        :param tenant: Name of the tenant the users belong to, default is None.
         """
-        cls.__valid_users.extend(users)
+        normalized = cls.__normalize_users(users)
+        with cls.__lock:
+            valid_users = dict(cls.__valid_users)
+            valid_users[tenant] = normalized
+            cls.__valid_users = valid_users
+
+    @classmethod
+    def is_valid(cls, user_id: int, tenant: str = None) -> bool:
+        """
+        Checks if a user has access.
+
+        :param user_id: User id.
+        :param tenant: Name of the tenant, default is None.
+        :return: True if the user has access, otherwise False.
+        """
+        return user_id in cls.__valid_users.get(tenant, frozenset())
+
+    @classmethod
+    def __track(cls, entries: OrderedDict, key: tuple, default: Callable) -> object:
+        """
+        Gets a tracked entry of a user, the least recently used entries are dropped.
+        Must be called with the lock held.
+
+        :param entries: Tracked entries.
+        :param key: Tenant and user id.
+        :param default: Function to create a new entry.
+        :return: Tracked entry.
+        """
+        entry = entries.pop(key, None)
+        if entry is None:
+            entry = default()
+            if len(entries) >= MAX_TRACKED_USERS:
+                entries.popitem(last=False)
+        entries[key] = entry
+        return entry
+
+    @classmethod
+    def __should_reply(cls, replies: OrderedDict, update: Update, tenant: str) -> bool:
+        """
+        Checks if a rejected user gets a reply, repeated rejections within the reply interval are dropped silently.
+
+        :param replies: Tracked time of the last reply per user.
+        :param update: Bot update.
+        :param tenant: Name of the tenant.
+        :return: True if the user should get a reply, otherwise False.
+        """
+        key = (tenant, update.effective_user.id)
+        now = time.monotonic()
+        with cls.__lock:
+            last_reply = cls.__track(replies, key, lambda: None)
+            if last_reply is not None and now - last_reply < DENIAL_REPLY_INTERVAL:
+                return False
+            replies[key] = now
+        return update.effective_message is not None
+
+    @classmethod
+    def __deny(cls, update: Update, tenant: str) -> None:
+        """
+        Replies the access denial, repeated denials of a user are dropped silently.
+
+        :param update: Bot update.
+        :param tenant: Name of the tenant.
+        """
+        user_id = update.effective_user.id
+        if cls.__should_reply(cls.__denials, update, tenant):
+            logger.warning('AccessManager: Access denied for {}'.format(user_id))
+            update.effective_message.reply_text('Access denied for you ({})!'.format(user_id))
+
+    @classmethod
+    def gate(cls, tenant: str = None, on_reject: Callable[[str], None] = None) -> Callable:
+        """
+        Creates a callback which rejects updates of unknown or rate limited users before any other handler.
+        Register it with a TypeHandler in the lowest handler group.
+
+        :param tenant: Name of the tenant, default is None.
+        :param on_reject: Function called with "denials" or "rate_limited" for every rejected update, default is None.
+        :return: Gate callback.
+        """
+
+        def reject(reason: str) -> None:
+            if on_reject is not None:
+                on_reject(reason)
+            raise DispatcherHandlerStop()
+
+        def check(update: Update, _: CallbackContext) -> None:
+            if update.effective_user is None:
+                return
+            user_id = update.effective_user.id
+            if not cls.is_valid(user_id, tenant):
+                cls.__deny(update, tenant)
+                reject('denials')
+            with cls.__lock:
+                bucket = cls.__track(cls.__buckets, (tenant, user_id), lambda: TokenBucket(RATE_LIMIT, RATE_BURST))
+                allowed = bucket.consume()
+            if not allowed:
+                logger.debug('AccessManager: Rate limit exceeded for {}'.format(user_id))
+                if cls.__should_reply(cls.__limit_notices, update, tenant):
+                    update.effective_message.reply_text('Too many requests, please wait a moment!')
+                reject('rate_limited')
+
+        return check
 
     def __call__(self, func: Callable) -> Callable:
+        @wraps(func)
         def wrapper(*args: List, **kwargs: Dict):
             update = None
             for arg in (args + tuple(kwargs.values())):
@@ -24,12 +215,12 @@ class AccessManager(object):
                     update = arg
                     break
             if update is None:
-                logging.critical('No argument has type "Update"!')
+                logger.critical('No argument has type "Update"!')
             else:
-                user_id = update.effective_user.id
-                if user_id not in self.__valid_users:
-                    logging.warning('AccessManager: Access denied for {}'.format(user_id))
-                    update.message.reply_text('Access denied for you ({})!'.format(user_id))
+                # decorated methods of hosted bots provide their tenant
+                tenant = getattr(args[0], 'tenant', None) if args else None
+                if not self.is_valid(update.effective_user.id, tenant):
+                    self.__deny(update, tenant)
                     return
                 else:
                     return func(*args, **kwargs)
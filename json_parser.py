@@ -1,4 +1,5 @@
 import json
+import logging
 from typing import Type, Dict, List
 
 from xvc_util import Point, Rectangle, Door, Room, Area
@@ -15,6 +16,7 @@ class Configuration(object):
         """
         token = None
         users = {}
+        admins = []
 
     class XiaomiVacuumCleanerSettings(object):
         """
@@ -24,6 +26,17 @@ class Configuration(object):
         token = None
         ip_address = None
 
+    class LoggingSettings(object):
+        """
+        Class to store configuration for logging.
+        """
+        file = 'bot.log'
+        max_bytes = 1024 * 1024
+        backup_count = 5
+        json = False
+        level = logging.NOTSET
+        levels = {'telegram': 100}
+
 
 class ConfigurationParser(object):
     """
@@ -55,8 +68,12 @@ class ConfigurationParser(object):
         result = Configuration.TelegramBotSettings()
         result.token = self.__root['telegram_bot']['token']
         users = self.__root['telegram_bot']['users']
+        result.users = {}
+        result.admins = []
         for user in users:
             result.users[user['name']] = user['id']
+            if user.get('admin', False):
+                result.admins.append(user['id'])
         return result
 
     def parse_xiaomi_vacuum_cleaner_settings(self) -> Configuration.XiaomiVacuumCleanerSettings:
@@ -71,6 +88,27 @@ class ConfigurationParser(object):
         result.ip_address = self.__root['xiaomi_vacuum_cleaner']['settings']['ip_address']
         return result
 
+    def parse_logging(self) -> Configuration.LoggingSettings:
+        """
+        Parses the logging settings.
+        The section is optional, missing values keep their defaults.
+
+        :return: Logging settings.
+        """
+        result = Configuration.LoggingSettings()
+        config_logging = self.__root.get('logging', {})
+        result.file = config_logging.get('file', result.file)
+        result.max_bytes = int(config_logging.get('max_bytes', result.max_bytes))
+        result.backup_count = int(config_logging.get('backup_count', result.backup_count))
+        result.json = bool(config_logging.get('json', result.json))
+        result.level = config_logging.get('level', result.level)
+        if isinstance(result.level, str):
+            result.level = result.level.upper()
+        result.levels = dict(result.levels)
+        for name, level in config_logging.get('levels', {}).items():
+            result.levels[name] = level.upper() if isinstance(level, str) else level
+        return result
+
     def parse_offset(self) -> Point:
         """
         Parses the x and y offset.
@@ -79,8 +117,8 @@ class ConfigurationParser(object):
         """
         zero_point = self.__root['xiaomi_vacuum_cleaner']['zone_cleaning']['zero_point_offset']
 
-        x = zero_point['x']
-        y = zero_point['y']
+        x = int(zero_point['x'])
+        y = int(zero_point['y'])
 
         return Point(x, y)
 
@@ -100,11 +138,11 @@ class ConfigurationParser(object):
         for element in elements:
             name = element['name']
             config_bottom_left = element['bottom_left']
-            bottom_left = Point(config_bottom_left['x'] + offset.x,
-                                config_bottom_left['y'] + offset.y)
+            bottom_left = Point(int(config_bottom_left['x']) + offset.x,
+                                int(config_bottom_left['y']) + offset.y)
             config_top_right = element['top_right']
-            top_right = Point(config_top_right['x'] + offset.x,
-                              config_top_right['y'] + offset.y)
+            top_right = Point(int(config_top_right['x']) + offset.x,
+                              int(config_top_right['y']) + offset.y)
             result[str(name.upper())] = _type(bottom_left, top_right, name)
 
         return result
@@ -1,82 +1,210 @@
+import argparse
 import logging
+import os
+from typing import Callable, Dict, List
 
-from telegram.ext import ConversationHandler, Updater, CommandHandler, MessageHandler, Filters
+from telegram import Update
+from telegram.ext import ConversationHandler, Updater, CommandHandler, MessageHandler, Filters, Handler, \
+    Dispatcher, TypeHandler, ExtBot
 
 from access_manager import AccessManager
-from json_parser import ConfigurationParser
+from json_parser import ConfigurationParser, Configuration
 from xvc_bot import XVCBot, MAIN_MENU, SELECT_FAN, SELECT_ZONE, FAN_BUTTONS, SKIP_BUTTON
 from xvc_helper import XVCHelper, XVCHelperSimulator
+from xvc_host import XVCHost
+from xvc_logging import setup_logging
+from xvc_persistence import JournalPersistence
+from xvc_profiler import Profiler, PROFILE_DIRECTORY, PROFILE_INTERVAL, PROFILE_SAMPLE
+from xvc_util import Rectangle
 
 # constants
-LOG_FILE = 'bot.log'
-LOG_DISABLE = 100
-
-# logging
-logging.getLogger('telegram').setLevel(LOG_DISABLE)
+CONFIG_PATH = 'config.json'
+RATES_SUFFIX = '_rates.json'
+TENANT_WORKERS = 1
+GATE_GROUP = -2
+CONVERSATION_NAME = 'xvc_conversation'
+PERSISTENCE_SUFFIX = '_conversations'
+
+
+def create_conversation_handler(xvc_bot: XVCBot, zones: Dict[str, List[Rectangle]],
+                                persistent: bool = False) -> ConversationHandler:
+    """
+    Creates the conversation handler of a bot.
+
+    :param xvc_bot: Xiaomi Vacuum Cleaner Bot.
+    :param zones: Dictionary with all cleaning zones.
+    :param persistent: True to persist the conversation states, default is False.
+    :return: Conversation handler.
+    """
+    return ConversationHandler(
+        entry_points=[CommandHandler('start', xvc_bot.start)],
+        states={
+            MAIN_MENU: [MessageHandler(Filters.regex('^({})$'.format('Status')),
+                                       xvc_bot.status),
+                        MessageHandler(Filters.regex('^({})$'.format('Home')),
+                                       xvc_bot.home),
+                        MessageHandler(Filters.regex('^({})$'.format('ZoneCleaning')),
+                                       xvc_bot.select_fan),
+                        MessageHandler(Filters.regex('^({})$'.format('Progress')),
+                                       xvc_bot.progress)],
+            SELECT_FAN: [MessageHandler(Filters.regex('^({})$'.format('|'.join(FAN_BUTTONS + SKIP_BUTTON))),
+                                        xvc_bot.select_zone)],
+            SELECT_ZONE: [MessageHandler(Filters.regex('^({})$'.format('|'.join([zone.title() for zone in zones.keys()]))),
+                                         xvc_bot.cleaning)]
+        },
+        fallbacks=[CommandHandler('cancel', xvc_bot.cancel)],
+        name=CONVERSATION_NAME,
+        persistent=persistent
+    )
 
-console_logging = logging.StreamHandler()
-console_logging.setLevel(logging.ERROR)
 
-file_logging = logging.FileHandler(LOG_FILE)
-file_logging.setLevel(logging.NOTSET)
+def register_handlers(dispatcher: Dispatcher, xvc_bot: XVCBot, zones: Dict[str, List[Rectangle]],
+                      tenant: str = None, on_reject: Callable[[str], None] = None) -> None:
+    """
+    Registers all handlers of a bot, the access gate rejects unknown and rate limited users first.
+    The conversation states are persisted if the dispatcher has a persistence.
+
+    :param dispatcher: Dispatcher.
+    :param xvc_bot: Xiaomi Vacuum Cleaner Bot.
+    :param zones: Dictionary with all cleaning zones.
+    :param tenant: Name of the tenant, default is None.
+    :param on_reject: Function called with the reason of every update rejected by the gate, default is None.
+    """
+    dispatcher.add_handler(TypeHandler(Update, AccessManager.gate(tenant, on_reject)), group=GATE_GROUP)
+    dispatcher.add_handler(create_conversation_handler(xvc_bot, zones, dispatcher.persistence is not None))
+    dispatcher.add_handler(CommandHandler('report', xvc_bot.report))
+    dispatcher.add_handler(CommandHandler('map', xvc_bot.zone_map))
+
+
+def wrap_callbacks(handlers: List[Handler], wrapper: Callable[[Callable], Callable]) -> None:
+    """
+    Wraps all handler callbacks, including the ones of conversations.
+
+    :param handlers: List of handlers.
+    :param wrapper: Function which wraps a callback.
+    """
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            nested = list(handler.entry_points) + list(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                nested.extend(state_handlers)
+            wrap_callbacks(nested, wrapper)
+        else:
+            handler.callback = wrapper(handler.callback)
 
-logging.basicConfig(level=logging.NOTSET,
-                    handlers=[console_logging, file_logging],
-                    format='%(asctime)23s - %(levelname)8s - %(name)25s - %(funcName)25s - %(message)s'
-                    )
 
+def create_tenant(path: str, tenant: str, host: XVCHost, profiler: Profiler = None) -> Updater:
+    """
+    Creates the bot of one configuration file.
 
-# main program
-def main():
-    # configuration
-    parser = ConfigurationParser('config.json')
+    :param path: Path to configuration file.
+    :param tenant: Name of the tenant.
+    :param host: Host with shared resources.
+    :param profiler: Profiler for the handlers, default is None.
+    :return: Updater with registered handlers.
+    """
+    parser = ConfigurationParser(path)
     config_bot = parser.parse_telegram_bot()
 
-    AccessManager.add_users(config_bot.users.values())
+    AccessManager.set_users(config_bot.users.values(), tenant)
 
     config_xiaomi = parser.parse_xiaomi_vacuum_cleaner_settings()
 
-    vacuum = None
-    try:
-        if config_xiaomi.simulation:
-            vacuum = XVCHelperSimulator(config_xiaomi.ip_address, config_xiaomi.token)
-        else:
-            vacuum = XVCHelper(config_xiaomi.ip_address, config_xiaomi.token)
-    except ConnectionError as ex:
-        logging.fatal(str(ex))
-        exit()
+    if config_xiaomi.simulation:
+        vacuum = XVCHelperSimulator(config_xiaomi.ip_address, config_xiaomi.token)
+    else:
+        vacuum = XVCHelper(config_xiaomi.ip_address, config_xiaomi.token)
 
     zones = parser.parse_zones()
+    rectangles = list(parser.parse_doors().values()) + list(parser.parse_rooms().values()) + \
+        list(parser.parse_areas().values())
 
-    xvc_bot = XVCBot(vacuum, zones)
+    xvc_bot = XVCBot(vacuum, zones, os.path.splitext(path)[0] + RATES_SUFFIX, tenant, host.create_executor(),
+                     rectangles)
 
-    updater = Updater(token=config_bot.token, use_context=True)
-    dispatcher = updater.dispatcher
+    # all bots share the connection pool of the host, each bot keeps its own dispatcher
+    bot = ExtBot(config_bot.token, request=host.request)
+    persistence = JournalPersistence(os.path.splitext(path)[0] + PERSISTENCE_SUFFIX)
+    try:
+        updater = Updater(bot=bot, use_context=True, workers=TENANT_WORKERS, persistence=persistence)
+        dispatcher = updater.dispatcher
 
-    conversation_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', xvc_bot.start)],
-        states={
-            MAIN_MENU: [MessageHandler(Filters.regex('^({})$'.format('Status')),
-                                       xvc_bot.status),
-                        MessageHandler(Filters.regex('^({})$'.format('Home')),
-                                       xvc_bot.home),
-                        MessageHandler(Filters.regex('^({})$'.format('ZoneCleaning')),
-                                       xvc_bot.select_fan)],
-            SELECT_FAN: [MessageHandler(Filters.regex('^({})$'.format('|'.join(FAN_BUTTONS + SKIP_BUTTON))),
-                                        xvc_bot.select_zone)],
-            SELECT_ZONE: [MessageHandler(Filters.regex('^({})$'.format('|'.join([zone.title() for zone in zones.keys()]))),
-                                         xvc_bot.cleaning)]
-        },
-        fallbacks=[CommandHandler('cancel', xvc_bot.cancel)]
-    )
+        register_handlers(dispatcher, xvc_bot, zones, tenant, lambda reason: host.metrics.increment(tenant, reason))
+
+        if profiler is not None:
+            for handlers in dispatcher.handlers.values():
+                wrap_callbacks(handlers, profiler.wrap)
+            dispatcher.add_handler(CommandHandler('profile', profiler.create_command(config_bot.admins)))
+    except Exception:
+        # the writer thread of the persistence must not outlive the failed tenant
+        persistence.close()
+        raise
+
+    return updater
 
-    dispatcher.add_handler(conversation_handler)
+
+def find_configs(path: str) -> List[str]:
+    """
+    Finds the configuration files.
+
+    :param path: Path to a configuration file or a directory with configuration files.
+    :return: List with paths to configuration files.
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.endswith('.json') and not name.endswith(RATES_SUFFIX))
+    return [path]
+
+
+# main program
+def main():
+    arguments = argparse.ArgumentParser(description='Xiaomi Vacuum Cleaner Telegram Bot')
+    arguments.add_argument('config', nargs='?', default=CONFIG_PATH,
+                           help='configuration file or directory with one configuration file per household')
+    arguments.add_argument('--profile', action='store_true',
+                           help='profile handlers, track allocations and measure import times')
+    arguments.add_argument('--profile-dir', default=PROFILE_DIRECTORY, help='directory for the profile dumps')
+    arguments.add_argument('--profile-interval', type=float, default=PROFILE_INTERVAL,
+                           help='interval in seconds to dump the profiles, 0 dumps only on /profile')
+    arguments.add_argument('--profile-sample', type=int, default=PROFILE_SAMPLE,
+                           help='profile every n-th handler call')
+    args = arguments.parse_args()
+
+    # configuration
+    configs = find_configs(args.config)
+    if configs:
+        log_listener = setup_logging(ConfigurationParser(configs[0]).parse_logging())
+    else:
+        log_listener = setup_logging(Configuration.LoggingSettings())
+    logging.info('start program')
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler(args.profile_dir, args.profile_sample, args.profile_interval)
+        profiler.start()
+
+    host = XVCHost(tenants=len(configs))
+    for path in configs:
+        tenant = os.path.splitext(os.path.basename(path))[0]
+        try:
+            host.add_tenant(tenant, create_tenant(path, tenant, host, profiler))
+        except Exception as ex:
+            logging.error('Tenant {}: cannot be created: {}'.format(tenant, ex))
+
+    if not host.tenants:
+        logging.fatal('No bot could be started!')
+        if profiler is not None:
+            profiler.stop()
+        log_listener.stop()
+        exit()
 
     logging.info('start bot')
-    updater.start_polling()
-    updater.idle()
+    host.start()
+    host.idle()
+    if profiler is not None:
+        profiler.stop()
+    log_listener.stop()
 
 
 if __name__ == '__main__':
-    logging.info('start program')
     main()
@@ -1,4 +1,7 @@
 import logging
+from concurrent.futures import Executor
+from datetime import timedelta
+from io import BytesIO
 from threading import Thread
 from typing import Dict, List
 
@@ -6,14 +9,22 @@ from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ConversationHandler, CallbackContext
 
 from access_manager import AccessManager
-from xvc_helper import XVCHelperBase, XVCHelperSimulator
+from xvc_estimator import CleaningEstimator
+from xvc_helper import XVCHelperBase, XVCHelperSimulator, XVCHelperProxy
+from xvc_map import ZoneMap
+from xvc_report import ReportCollector
 from xvc_util import Rectangle
 
+# logging
+logger = logging.getLogger(__name__)
+
 # constants
 SKIP_BUTTON = ['Skip']
-MAIN_BUTTONS = ['Status', 'Home', 'ZoneCleaning']
+MAIN_BUTTONS = ['Status', 'Home', 'ZoneCleaning', 'Progress']
 FAN_BUTTONS = [value.name for value in XVCHelperBase.FanLevel]
 
+RUN_POLL_INTERVAL = 30
+
 MAIN_MENU, SELECT_FAN, SELECT_ZONE = range(3)
 
 
@@ -45,15 +56,22 @@ class XVCBot(object):
     Xiaomi Vacuum Cleaner Bot.
     """
 
-    def __init__(self, vacuum: XVCHelperBase, zones: Dict[str, List[Rectangle]]):
+    def __init__(self, vacuum: XVCHelperBase, zones: Dict[str, List[Rectangle]], rates_path: str = None,
+                 tenant: str = None, executor: Executor = None, rectangles: List[Rectangle] = None):
         """
         Initializes the Xiaomi Vacuum Cleaner Bot.
         This bot is used as an conversation bot with various states.
 
         :param vacuum: Reference to vacuum cleaner.
         :param zones: Dictionary with all cleaning zones.
+        :param rates_path: Path to store the observed cleaning rates, default is None.
+        :param tenant: Name of the tenant if several bots are hosted, default is None.
+        :param executor: Executor for the device calls of this bot, default runs them in the calling thread.
+        :param rectangles: List with all doors, rooms and areas for the zone map, default is None.
         """
-        self.__vacuum = vacuum
+        self.tenant = tenant
+        self.__simulation = isinstance(vacuum, XVCHelperSimulator)
+        self.__vacuum = XVCHelperProxy(vacuum, executor) if executor is not None else vacuum
         self.__zones = zones
         self.__main_buttons = ReplyKeyboardMarkup(
             XVCBot.build_menu(MAIN_BUTTONS),
@@ -65,6 +83,11 @@ class XVCBot(object):
             XVCBot.build_menu(sorted([zone.title() for zone in self.__zones.keys()])),
             one_time_keyboard=True)
         self.__status_thread = None
+        self.__report_collector = ReportCollector(vacuum, executor=executor)
+        self.__zone_map = ZoneMap(self.__zones, rectangles)
+        self.__map_file_ids = {}
+        self.__estimator = CleaningEstimator(self.__zones, rates_path)
+        self.__fan_level = XVCHelperBase.FanLevel.Balanced
 
     @staticmethod
     def build_menu(buttons, columns=2, header_buttons=None, footer_buttons=None) -> List:
@@ -84,6 +107,17 @@ class XVCBot(object):
             menu.append(footer_buttons)
         return menu
 
+    @staticmethod
+    def __log_extra(update: Update, command: str) -> Dict:
+        """
+        Creates the structured logging fields for a bot command.
+
+        :param update: Bot update.
+        :param command: Name of the bot command.
+        :return: Dictionary with structured logging fields.
+        """
+        return {'chat_id': update.effective_chat.id, 'command': command}
+
     def __finish(self, update: Update, message: str) -> int:
         """
         Helper function to finish the conversation.
@@ -95,6 +129,24 @@ class XVCBot(object):
         update.message.reply_text(message, reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
 
+    def __send_map(self, update: Update, selected: str = None) -> None:
+        """
+        Sends the zone map, an already uploaded image is reused by its telegram file id.
+
+        :param update: Bot update.
+        :param selected: Name of the highlighted zone, default is None.
+        """
+        if not ZoneMap.available():
+            return
+        key = self.__zone_map.key(selected)
+        file_id = self.__map_file_ids.get(key)
+        if file_id is not None:
+            update.message.reply_photo(photo=file_id)
+        else:
+            message = update.message.reply_photo(photo=BytesIO(self.__zone_map.render(selected)))
+            if message.photo:
+                self.__map_file_ids[key] = message.photo[-1].file_id
+
     @AccessManager()
     def start(self, update: Update, _: CallbackContext) -> int:
         """
@@ -104,10 +156,11 @@ class XVCBot(object):
         :param _: Unused parameter.
         :return: State for main menu.
         """
-        logging.info('Bot command: /start')
-        self.__status_thread = StatusThread(self.__vacuum)
-        self.__status_thread.start()
-        if isinstance(self.__vacuum, XVCHelperSimulator):
+        logger.info('Bot command: /start', extra=self.__log_extra(update, 'start'))
+        status_thread = StatusThread(self.__vacuum)
+        status_thread.start()
+        self.__status_thread = status_thread
+        if self.__simulation:
             update.message.reply_text('!!! Simulation !!!')
         update.message.reply_text('Main menu', reply_markup=self.__main_buttons)
         return MAIN_MENU
@@ -119,14 +172,20 @@ class XVCBot(object):
         :param update: Bot update.
         :return: True if connection could established.
         """
-        if self.__status_thread is not None:
-            if self.__status_thread.is_alive():
-                update.message.reply_text('Wait for status...', reply_markup=ReplyKeyboardRemove())
-                self.__status_thread.join()
-
-        if not self.__status_thread.success:
+        # another conversation may replace the thread meanwhile
+        status_thread = self.__status_thread
+        if status_thread is None:
+            # conversation was restored after a restart
+            status_thread = StatusThread(self.__vacuum)
+            status_thread.start()
+            self.__status_thread = status_thread
+        if status_thread.is_alive():
+            update.message.reply_text('Wait for status...', reply_markup=ReplyKeyboardRemove())
+            status_thread.join()
+
+        if not status_thread.success:
             self.__finish(update, 'Cannot establish connection to vacuum cleaner!')
-        return self.__status_thread.success
+        return status_thread.success
 
     def status(self, update: Update, _: CallbackContext) -> int:
         """
@@ -138,7 +197,7 @@ class XVCBot(object):
         """
         if not self.__wait_for_status(update):
             return ConversationHandler.END
-        logging.info('Bot command: status')
+        logger.info('Bot command: status', extra=self.__log_extra(update, 'status'))
         result, state = self.__vacuum.status()
         if result:
             message = 'State: {}'.format(state)
@@ -156,7 +215,7 @@ class XVCBot(object):
         """
         if not self.__wait_for_status(update):
             return ConversationHandler.END
-        logging.info('Bot command: home')
+        logger.info('Bot command: home', extra=self.__log_extra(update, 'home'))
         if self.__vacuum.home():
             message = 'Vacuum cleaner goes back to the dock...'
         else:
@@ -173,41 +232,147 @@ class XVCBot(object):
         """
         if not self.__wait_for_status(update):
             return ConversationHandler.END
-        logging.info('Bot command: select fan')
+        logger.info('Bot command: select fan', extra=self.__log_extra(update, 'select_fan'))
         update.message.reply_text('Select fan speed!', reply_markup=self.__fan_buttons)
         return SELECT_FAN
 
-    def select_zone(self, update: Update, _: CallbackContext) -> int:
+    def select_zone(self, update: Update, context: CallbackContext) -> int:
         """
         Creates the menu for cleaning zones.
 
         :param update: Bot update.
-        :param _: Unused parameter.
+        :param context: Callback context to store the selected fan level of the chat.
         :return: State for selecting cleaning zone.
         """
-        logging.info('Bot command: select zone')
+        logger.info('Bot command: select zone', extra=self.__log_extra(update, 'select_zone'))
         level = update.message.text
         if level != SKIP_BUTTON[0]:
-            self.__vacuum.set_fan_level(XVCHelperBase.FanLevel[level])
+            self.__fan_level = XVCHelperBase.FanLevel[level]
+            self.__vacuum.set_fan_level(self.__fan_level)
+            context.chat_data['fan_level'] = level
+        else:
+            context.chat_data.pop('fan_level', None)
+        self.__send_map(update)
         update.message.reply_text('Select zone!', reply_markup=self.__zone_buttons)
         return SELECT_ZONE
 
-    def cleaning(self, update: Update, _: CallbackContext) -> int:
+    def cleaning(self, update: Update, context: CallbackContext) -> int:
         """
         Starts cleaning.
 
         :param update: Bot update.
-        :param _: Unused parameter.
+        :param context: Callback context with the selected fan level of the chat.
         :return: State for conversation end.
         """
-        logging.info('Bot command: cleaning')
+        logger.info('Bot command: cleaning', extra=self.__log_extra(update, 'cleaning'))
         zone = update.message.text
+        # the fan level selected in this chat, otherwise the last level set on the vacuum cleaner
+        level = context.chat_data.get('fan_level')
+        fan_level = XVCHelperBase.FanLevel[level] if level is not None else self.__fan_level
+        duration, usage = self.__estimator.estimate(zone, fan_level)
+        result, battery = self.__vacuum.battery()
+        warning = False
+        if result:
+            possible, warning = CleaningEstimator.check_battery(battery, usage)
+            if not possible:
+                return self.__finish(update, 'Battery too low for cleaning {} ({} %, needs about {:.0f} %)!'.format(
+                    zone, battery, usage))
         if self.__vacuum.start_zone_cleaning(self.__zones[zone.upper()]):
-            message = 'Start cleaning {}...'.format(zone)
+            if result:
+                self.__estimator.start(zone, fan_level, battery)
+                self.__watch_run(context)
+            self.__send_map(update, zone)
+            message = 'Start cleaning {}...\nEstimated time: {}, battery: {:.0f} %'.format(
+                zone, timedelta(seconds=round(duration)), usage)
+            if warning:
+                message += '\nWarning: battery is low ({} %)!'.format(battery)
         else:
             message = 'Error'
         return self.__finish(update, message)
 
+    def __watch_run(self, context: CallbackContext) -> None:
+        """
+        Schedules the job which polls the vacuum cleaner until the tracked cleaning run finished.
+
+        :param context: Callback context with the job queue.
+        """
+        if context.job_queue is None:
+            return
+        name = 'cleaning_run_{}'.format(self.tenant)
+        if not context.job_queue.get_jobs_by_name(name):
+            context.job_queue.run_repeating(self.poll_run, RUN_POLL_INTERVAL, first=RUN_POLL_INTERVAL, name=name)
+
+    def poll_run(self, context: CallbackContext) -> None:
+        """
+        Polls the vacuum cleaner to detect the end of the tracked cleaning run without a user request.
+
+        :param context: Callback context of the job.
+        """
+        result_status, state = self.__vacuum.status()
+        result_battery, battery = self.__vacuum.battery()
+        if not (result_status and result_battery):
+            if self.__estimator.poll_failed():
+                context.job.schedule_removal()
+            return
+        result_run, duration, area = self.__vacuum.last_run()
+        if not result_run:
+            duration, area = None, None
+        if self.__estimator.update(state, battery, duration, area):
+            context.job.schedule_removal()
+
+    def progress(self, update: Update, _: CallbackContext) -> int:
+        """
+        Reports the progress and remaining time of the current cleaning.
+
+        :param update: Bot update.
+        :param _: Unused parameter.
+        :return: State for conversation end.
+        """
+        if not self.__wait_for_status(update):
+            return ConversationHandler.END
+        logger.info('Bot command: progress', extra=self.__log_extra(update, 'progress'))
+        result_status, state = self.__vacuum.status()
+        result_battery, battery = self.__vacuum.battery()
+        if not (result_status and result_battery):
+            return self.__finish(update, 'Error')
+        running, elapsed, remaining = self.__estimator.progress(state)
+        if running:
+            message = 'Cleaning since {}, about {} remaining (battery {} %)'.format(
+                timedelta(seconds=round(elapsed)), timedelta(seconds=round(remaining)), battery)
+        else:
+            message = 'No cleaning in progress (state: {}, battery {} %)'.format(state, battery)
+        return self.__finish(update, message)
+
+    @AccessManager()
+    def zone_map(self, update: Update, context: CallbackContext) -> None:
+        """
+        Sends the zone map, the zone given as argument is highlighted.
+
+        :param update: Bot update.
+        :param context: Callback context with optional zone name as argument.
+        """
+        logger.info('Bot command: /map', extra=self.__log_extra(update, 'map'))
+        if not ZoneMap.available():
+            update.message.reply_text('Zone map is not available!')
+            return
+        selected = ' '.join(context.args) if context.args else None
+        if selected is not None and selected.upper() not in self.__zones:
+            update.message.reply_text('Zone "{}" does not exist!'.format(selected))
+            return
+        self.__send_map(update, selected)
+
+    @AccessManager()
+    def report(self, update: Update, _: CallbackContext) -> None:
+        """
+        Sends a diagnostics report with status, consumables, clean summary and do not disturb settings.
+
+        :param update: Bot update.
+        :param _: Unused parameter.
+        """
+        logger.info('Bot command: /report', extra=self.__log_extra(update, 'report'))
+        report = self.__report_collector.collect()
+        update.message.reply_text(ReportCollector.render(report))
+
     def cancel(self, update: Update, _: CallbackContext) -> int:
         """
         Cancels the current conversation.
@@ -216,6 +381,6 @@ class XVCBot(object):
         :param _: Unused parameter.
         :return: State for conversation end.
         """
-        logging.info('Bot command: cancel')
+        logger.info('Bot command: cancel', extra=self.__log_extra(update, 'cancel'))
         message = 'Canceled...'
         return self.__finish(update, message)
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from xvc_helper import XVCHelperBase
+from xvc_util import Rectangle
+
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+BATTERY_RESERVE = 10
+BATTERY_WARNING = 25
+RATE_SMOOTHING = 0.3
+MIN_RUN_DURATION = 60
+RUN_START_TIMEOUT = 300
+MAX_POLL_FAILURES = 20
+CLEANING_STATES = ['Cleaning', 'Zoned cleaning', 'Spot cleaning', 'Going to target', 'Paused']
+
+# default cleaning rates per fan level: cleaned square meters per second, used battery percent per square meter
+DEFAULT_RATES = {
+    XVCHelperBase.FanLevel.Quiet: (0.018, 0.35),
+    XVCHelperBase.FanLevel.Balanced: (0.017, 0.45),
+    XVCHelperBase.FanLevel.Turbo: (0.016, 0.60),
+    XVCHelperBase.FanLevel.Max: (0.015, 0.75),
+    XVCHelperBase.FanLevel.Mob: (0.012, 0.55)
+}
+
+
+class CleaningRun(object):
+    """
+    Simple class to store the currently running cleaning.
+    """
+
+    def __init__(self, zone: str, fan_level: XVCHelperBase.FanLevel, battery: int, duration: float) -> None:
+        """
+        Initialize an object of class CleaningRun.
+
+        :param zone: Name of the cleaning zone.
+        :param fan_level: Fan level of the cleaning.
+        :param battery: Battery level at start in percent.
+        :param duration: Estimated duration in seconds.
+        """
+        self.zone = zone
+        self.fan_level = fan_level
+        self.battery = battery
+        self.duration = duration
+        self.start = time.monotonic()
+        self.cleaning = False
+        self.failures = 0
+
+
+class CleaningEstimator(object):
+    """
+    Estimates cleaning time and battery usage of the cleaning zones.
+    The zone areas and estimates are precomputed, the rates are updated with every finished cleaning run.
+    """
+
+    def __init__(self, zones: Dict[str, List[Rectangle]], path: str = None) -> None:
+        """
+        Initialize an object of class CleaningEstimator.
+
+        :param zones: Dictionary with all cleaning zones.
+        :param path: Path to store the observed rates, default is None.
+        """
+        self.__path = path
+        self.__areas = {name: CleaningEstimator.zone_area(rectangles) for name, rectangles in zones.items()}
+        self.__rates = dict(DEFAULT_RATES)
+        self.__load()
+        self.__estimates = {}
+        for fan_level in XVCHelperBase.FanLevel:
+            self.__update_estimates(fan_level)
+        self.__run = None
+        self.__lock = Lock()
+
+    @staticmethod
+    def zone_area(rectangles: List[Rectangle]) -> float:
+        """
+        Calculates the area to clean including repeated cleaning cycles.
+
+        :param rectangles: Rectangles of the zone.
+        :return: Area in square meters.
+        """
+        area = 0
+        for rectangle in rectangles:
+            width = abs(int(rectangle.top_right.x) - int(rectangle.bottom_left.x))
+            height = abs(int(rectangle.top_right.y) - int(rectangle.bottom_left.y))
+            area += width * height * getattr(rectangle, 'number', 1)
+        # coordinates are in millimeters
+        return area / 1000000
+
+    def __load(self) -> None:
+        """
+        Loads observed rates from file.
+        """
+        if self.__path is None or not os.path.exists(self.__path):
+            return
+        try:
+            with open(self.__path) as file:
+                rates = json.load(file)
+            for name, (area_per_second, battery_per_area) in rates.items():
+                self.__rates[XVCHelperBase.FanLevel[name]] = (area_per_second, battery_per_area)
+        except (ValueError, KeyError, TypeError) as ex:
+            logger.warning('Cannot load cleaning rates: {}'.format(ex))
+
+    def __save(self) -> None:
+        """
+        Saves observed rates to file.
+        """
+        if self.__path is None:
+            return
+        with open(self.__path, 'w') as file:
+            json.dump({fan_level.name: rate for fan_level, rate in self.__rates.items()}, file)
+
+    def __update_estimates(self, fan_level: XVCHelperBase.FanLevel) -> None:
+        """
+        Recomputes the estimates of all zones for one fan level.
+
+        :param fan_level: Fan level.
+        """
+        area_per_second, battery_per_area = self.__rates[fan_level]
+        for name, area in self.__areas.items():
+            self.__estimates[(name, fan_level)] = (area / area_per_second, area * battery_per_area)
+
+    def estimate(self, zone: str, fan_level: XVCHelperBase.FanLevel) -> Tuple[float, float]:
+        """
+        Gets the estimate of a cleaning zone.
+
+        :param zone: Name of the cleaning zone.
+        :param fan_level: Fan level.
+        :return: Duration in seconds.
+        :return: Battery usage in percent.
+        """
+        return self.__estimates[(zone.upper(), fan_level)]
+
+    @staticmethod
+    def check_battery(battery: int, usage: float) -> Tuple[bool, bool]:
+        """
+        Checks if the battery level is sufficient.
+
+        :param battery: Battery level in percent.
+        :param usage: Estimated battery usage in percent.
+        :return: True if cleaning is possible, otherwise False.
+        :return: True if the battery is low, otherwise False.
+        """
+        remaining = battery - usage
+        return remaining >= BATTERY_RESERVE, remaining < BATTERY_WARNING
+
+    def start(self, zone: str, fan_level: XVCHelperBase.FanLevel, battery: int) -> None:
+        """
+        Starts tracking a cleaning run.
+
+        :param zone: Name of the cleaning zone.
+        :param fan_level: Fan level.
+        :param battery: Battery level at start in percent.
+        """
+        duration, _ = self.estimate(zone, fan_level)
+        with self.__lock:
+            self.__run = CleaningRun(zone.upper(), fan_level, battery, duration)
+
+    @property
+    def running(self) -> bool:
+        """
+        Checks if a cleaning run is tracked.
+
+        :return: True if a run is tracked, otherwise False.
+        """
+        return self.__run is not None
+
+    def progress(self, state: str) -> Tuple[bool, float, float]:
+        """
+        Gets the progress of the current cleaning run.
+
+        :param state: Current state of the vacuum cleaner.
+        :return: True if a run is in progress, otherwise False.
+        :return: Elapsed time in seconds.
+        :return: Remaining time in seconds.
+        """
+        run = self.__run
+        if run is None or state not in CLEANING_STATES:
+            return False, 0, 0
+        elapsed = time.monotonic() - run.start
+        return True, elapsed, max(run.duration - elapsed, 0)
+
+    def update(self, state: str, battery: int, duration: float = None, area: float = None) -> bool:
+        """
+        Updates the current cleaning run with a polled state of the vacuum cleaner.
+        A run is finished as soon as the vacuum cleaner left the cleaning states, the observed rates are updated.
+        A run which never started cleaning is dropped after a timeout.
+
+        :param state: Current state of the vacuum cleaner.
+        :param battery: Current battery level in percent.
+        :param duration: Duration of the run reported by the vacuum cleaner in seconds, default is the polled time.
+        :param area: Area of the run reported by the vacuum cleaner in square meters, default is the zone area.
+        :return: True if no run is tracked anymore, otherwise False.
+        """
+        with self.__lock:
+            run = self.__run
+            if run is None:
+                return True
+            elapsed = time.monotonic() - run.start
+            run.failures = 0
+            if state in CLEANING_STATES:
+                run.cleaning = True
+                return False
+            if not run.cleaning:
+                if elapsed < RUN_START_TIMEOUT:
+                    return False
+                logger.info('Cleaning run of {} did not start'.format(run.zone))
+                self.__run = None
+                return True
+            self.__run = None
+            self.__finish(run, duration or elapsed, run.battery - battery, area or self.__areas[run.zone])
+            return True
+
+    def poll_failed(self) -> bool:
+        """
+        Counts a failed poll of the vacuum cleaner.
+        A run is dropped after too many consecutive failures,
+        e.g. if the vacuum cleaner went offline with an empty battery.
+
+        :return: True if no run is tracked anymore, otherwise False.
+        """
+        with self.__lock:
+            run = self.__run
+            if run is None:
+                return True
+            run.failures += 1
+            if run.failures < MAX_POLL_FAILURES:
+                return False
+            logger.warning('Drop cleaning run of {}, vacuum cleaner did not respond to {} polls'.format(
+                run.zone, run.failures))
+            self.__run = None
+            return True
+
+    def __finish(self, run: CleaningRun, duration: float, usage: int, area: float) -> None:
+        """
+        Updates the rates of the fan level with a finished cleaning run.
+
+        :param run: Finished cleaning run.
+        :param duration: Duration in seconds.
+        :param usage: Used battery in percent.
+        :param area: Cleaned area in square meters.
+        """
+        if duration < MIN_RUN_DURATION or usage <= 0 or area <= 0:
+            logger.info('Ignore cleaning run of {} for estimation'.format(run.zone))
+            return
+        area_per_second, battery_per_area = self.__rates[run.fan_level]
+        area_per_second += RATE_SMOOTHING * (area / duration - area_per_second)
+        battery_per_area += RATE_SMOOTHING * (usage / area - battery_per_area)
+        self.__rates[run.fan_level] = (area_per_second, battery_per_area)
+        self.__update_estimates(run.fan_level)
+        logger.info('Update cleaning rates of {}: {:.4f} m²/s, {:.3f} %/m²'.format(run.fan_level.name,
+                                                                                area_per_second,
+                                                                                battery_per_area))
+        try:
+            self.__save()
+        except OSError as ex:
+            logger.warning('Cannot save cleaning rates: {}'.format(ex))
@@ -1,12 +1,42 @@
 import logging
+import time
+from concurrent.futures import Executor, TimeoutError
+from functools import wraps
 from abc import abstractmethod, ABCMeta
 from enum import Enum
-from typing import List, Tuple
+from typing import List, Tuple, Callable, Dict
 
 from miio import Vacuum, DeviceException
 
 from xvc_util import XVCListable
 
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+DEVICE_TIMEOUT = 15.0
+
+
+def log_latency(func: Callable) -> Callable:
+    """
+    Decorator to log the latency of a vacuum cleaner call.
+
+    :param func: Vacuum cleaner method.
+    :return: Wrapped method.
+    """
+
+    @wraps(func)
+    def wrapper(*args: List, **kwargs: Dict):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latency = time.perf_counter() - start
+            logger.debug('Device call: {}() took {:.3f}s'.format(func.__name__, latency),
+                         extra={'command': func.__name__, 'latency': round(latency, 3)})
+
+    return wrapper
+
 
 class XVCHelperBase(metaclass=ABCMeta):
     """
@@ -73,6 +103,67 @@ class XVCHelperBase(metaclass=ABCMeta):
         """
         raise NotImplementedError()
 
+    @abstractmethod
+    def battery(self) -> Tuple[bool, int]:
+        """
+        Gets the battery level.
+
+        :return: True on success, otherwise False.
+        :return: Battery level in percent.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def detailed_status(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets detailed status (state, battery, error, fan speed, area, time).
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def last_run(self) -> Tuple[bool, float, float]:
+        """
+        Gets duration and area of the current or last cleaning run reported by the vacuum cleaner.
+
+        :return: True on success, otherwise False.
+        :return: Duration in seconds.
+        :return: Area in square meters.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def consumables(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets remaining lifetime of the consumables.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def clean_summary(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the summary of all cleaning runs.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def dnd(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the do not disturb settings.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        raise NotImplementedError()
+
 
 class XVCHelperSimulator(XVCHelperBase):
     """
@@ -86,7 +177,7 @@ class XVCHelperSimulator(XVCHelperBase):
         :param ip: IP address of the vacuum cleaner.
         :param token: Token of the vacuum cleaner.
         """
-        logging.info('Simulation: {}:{}'.format(ip, token))
+        logger.info('Simulation: {}:{}'.format(ip, token))
         self.__ip = ip
         self.__token = token
 
@@ -97,7 +188,7 @@ class XVCHelperSimulator(XVCHelperBase):
         :return: True on success, otherwise False.
         :return:
         """
-        logging.info('Simulation: status()')
+        logger.info('Simulation: status()')
         return True, 'Simulation'
 
     def pause(self) -> bool:
@@ -106,7 +197,7 @@ class XVCHelperSimulator(XVCHelperBase):
 
         :return: True on success, otherwise False.
         """
-        logging.info('XVCHelperSimulator: pause()')
+        logger.info('XVCHelperSimulator: pause()')
         return True
 
     def home(self) -> bool:
@@ -115,7 +206,7 @@ class XVCHelperSimulator(XVCHelperBase):
 
         :return: True on success, otherwise False.
         """
-        logging.info('Simulation: home()')
+        logger.info('Simulation: home()')
         return True
 
     def start_zone_cleaning(self, zones: List[XVCListable]) -> bool:
@@ -125,9 +216,9 @@ class XVCHelperSimulator(XVCHelperBase):
         :param zones: Different zones to clean.
         :return: True on success, otherwise False.
         """
-        logging.info('Simulation: start_zone_cleaning()')
+        logger.info('Simulation: start_zone_cleaning()')
         for zone in zones:
-            logging.info('Simulation: {}'.format(zone))
+            logger.info('Simulation: {}'.format(zone))
         return True
 
     def set_fan_level(self, fan_level: XVCHelperBase.FanLevel) -> bool:
@@ -137,9 +228,72 @@ class XVCHelperSimulator(XVCHelperBase):
         :param fan_level: New fan level.
         :return: True on success, otherwise False.
         """
-        logging.info('Simulation: set_fan_level()')
+        logger.info('Simulation: set_fan_level()')
         return True
 
+    def battery(self) -> Tuple[bool, int]:
+        """
+        Gets the battery level.
+
+        :return: True on success, otherwise False.
+        :return: Battery level in percent.
+        """
+        logger.info('Simulation: battery()')
+        return True, 100
+
+    def detailed_status(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets detailed status (state, battery, error, fan speed, area, time).
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        logger.info('Simulation: detailed_status()')
+        return True, {'State': 'Simulation', 'Battery': '100 %', 'Error': 'No error',
+                      'Fan speed': '60 %', 'Area': '0.0 m²', 'Time': '0:00:00'}
+
+    def last_run(self) -> Tuple[bool, float, float]:
+        """
+        Gets duration and area of the current or last cleaning run reported by the vacuum cleaner.
+
+        :return: True on success, otherwise False.
+        :return: Duration in seconds.
+        :return: Area in square meters.
+        """
+        logger.info('Simulation: last_run()')
+        return False, 0, 0
+
+    def consumables(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets remaining lifetime of the consumables.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        logger.info('Simulation: consumables()')
+        return True, {'Main brush': '300:00:00', 'Side brush': '200:00:00',
+                      'Filter': '150:00:00', 'Sensors': '30:00:00'}
+
+    def clean_summary(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the summary of all cleaning runs.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        logger.info('Simulation: clean_summary()')
+        return True, {'Count': '0', 'Total area': '0.0 m²', 'Total time': '0:00:00'}
+
+    def dnd(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the do not disturb settings.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        logger.info('Simulation: dnd()')
+        return True, {'Enabled': 'False', 'Start': '22:00:00', 'End': '08:00:00'}
+
 
 class XVCHelper(XVCHelperBase):
     """
@@ -165,6 +319,7 @@ class XVCHelper(XVCHelperBase):
         else:
             raise ConnectionError('Cannot establish connection to Vacuum Cleaner at {}'.format(ip))
 
+    @log_latency
     def status(self) -> Tuple[bool, str]:
         """
         Gets current status.
@@ -180,6 +335,7 @@ class XVCHelper(XVCHelperBase):
             result = False
         return result, vacuum_status
 
+    @log_latency
     def pause(self) -> bool:
         """
         Pause vacuum cleaner.
@@ -189,6 +345,7 @@ class XVCHelper(XVCHelperBase):
         result = self.__vacuum.pause()
         return result == XVCHelper.RESPONSE_SUCCEEDED
 
+    @log_latency
     def home(self) -> bool:
         """
         Stops cleaning and sends vacuum cleaner back to the dock.
@@ -198,6 +355,7 @@ class XVCHelper(XVCHelperBase):
         result = self.__vacuum.home()
         return result == XVCHelper.RESPONSE_SUCCEEDED
 
+    @log_latency
     def start_zone_cleaning(self, zones: List[XVCListable]) -> bool:
         """
         Start the zone cleanup.
@@ -210,6 +368,7 @@ class XVCHelper(XVCHelperBase):
         result = self.__vacuum.zoned_clean(zones_list)
         return result == XVCHelper.RESPONSE_SUCCEEDED
 
+    @log_latency
     def set_fan_level(self, fan_level: XVCHelperBase.FanLevel) -> bool:
         """
         Sets the fan level.
@@ -219,3 +378,243 @@ class XVCHelper(XVCHelperBase):
         """
         result = self.__vacuum.set_fan_speed(fan_level.value)
         return result == XVCHelper.RESPONSE_SUCCEEDED
+
+    @log_latency
+    def battery(self) -> Tuple[bool, int]:
+        """
+        Gets the battery level.
+
+        :return: True on success, otherwise False.
+        :return: Battery level in percent.
+        """
+        battery = None
+        try:
+            battery = self.__vacuum.status().battery
+            result = True
+        except DeviceException:
+            result = False
+        return result, battery
+
+    @log_latency
+    def detailed_status(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets detailed status (state, battery, error, fan speed, area, time).
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        try:
+            vacuum_status = self.__vacuum.status()
+        except DeviceException:
+            return False, {}
+        return True, {'State': vacuum_status.state,
+                      'Battery': '{} %'.format(vacuum_status.battery),
+                      'Error': vacuum_status.error,
+                      'Fan speed': '{} %'.format(vacuum_status.fanspeed),
+                      'Area': '{:.1f} m²'.format(vacuum_status.clean_area),
+                      'Time': str(vacuum_status.clean_time)}
+
+    @log_latency
+    def last_run(self) -> Tuple[bool, float, float]:
+        """
+        Gets duration and area of the current or last cleaning run reported by the vacuum cleaner.
+
+        :return: True on success, otherwise False.
+        :return: Duration in seconds.
+        :return: Area in square meters.
+        """
+        try:
+            vacuum_status = self.__vacuum.status()
+        except DeviceException:
+            return False, 0, 0
+        return True, vacuum_status.clean_time.total_seconds(), vacuum_status.clean_area
+
+    @log_latency
+    def consumables(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets remaining lifetime of the consumables.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        try:
+            consumable_status = self.__vacuum.consumable_status()
+        except DeviceException:
+            return False, {}
+        return True, {'Main brush': str(consumable_status.main_brush_left),
+                      'Side brush': str(consumable_status.side_brush_left),
+                      'Filter': str(consumable_status.filter_left),
+                      'Sensors': str(consumable_status.sensor_dirty_left)}
+
+    @log_latency
+    def clean_summary(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the summary of all cleaning runs.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        try:
+            summary = self.__vacuum.clean_history()
+        except DeviceException:
+            return False, {}
+        return True, {'Count': str(summary.count),
+                      'Total area': '{:.1f} m²'.format(summary.total_area),
+                      'Total time': str(summary.total_duration)}
+
+    @log_latency
+    def dnd(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the do not disturb settings.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        try:
+            dnd_status = self.__vacuum.dnd_status()
+        except DeviceException:
+            return False, {}
+        return True, {'Enabled': str(dnd_status.enabled),
+                      'Start': str(dnd_status.start),
+                      'End': str(dnd_status.end)}
+
+
+class XVCHelperProxy(XVCHelperBase):
+    """
+    Runs all calls of a vacuum cleaner on an executor, a call which misses the timeout fails.
+    While a call which missed the timeout still hangs, further calls fail immediately,
+    so a handler waits at most one timeout for an unresponsive vacuum cleaner.
+    """
+
+    def __init__(self, vacuum: XVCHelperBase, executor: Executor, timeout: float = DEVICE_TIMEOUT) -> None:
+        """
+        Initialize an object of class XVCHelperProxy.
+
+        :param vacuum: Reference to vacuum cleaner.
+        :param executor: Executor for the device calls.
+        :param timeout: Maximum time in seconds to wait for a device call.
+        """
+        self.vacuum = vacuum
+        self.__executor = executor
+        self.__timeout = timeout
+        self.__stalled = None
+
+    def __call(self, default: object, method: Callable, *args: List) -> object:
+        """
+        Runs a device call on the executor.
+
+        :param default: Result if the call missed the timeout.
+        :param method: Method of the vacuum cleaner.
+        :param args: Arguments of the method.
+        :return: Result of the method or the default result.
+        """
+        stalled = self.__stalled
+        if stalled is not None and not stalled.done():
+            logger.warning('Device call: {}() skipped, vacuum cleaner does not respond'.format(method.__name__))
+            return default
+        future = self.__executor.submit(method, *args)
+        try:
+            return future.result(timeout=self.__timeout)
+        except TimeoutError:
+            if not future.cancel():
+                self.__stalled = future
+            logger.warning('Device call: {}() missed the timeout'.format(method.__name__))
+            return default
+
+    def status(self) -> Tuple[bool, str]:
+        """
+        Gets current status.
+
+        :return: True on success, otherwise False.
+        :return: Vacuum status.
+        """
+        return self.__call((False, None), self.vacuum.status)
+
+    def pause(self) -> bool:
+        """
+        Pause vacuum cleaner.
+
+        :return: True on success, otherwise False.
+        """
+        return self.__call(False, self.vacuum.pause)
+
+    def home(self) -> bool:
+        """
+        Stops cleaning and sends vacuum cleaner back to the dock.
+
+        :return: True on success, otherwise False.
+        """
+        return self.__call(False, self.vacuum.home)
+
+    def start_zone_cleaning(self, zones: List[XVCListable]) -> bool:
+        """
+        Start the zone cleanup.
+
+        :param zones: Different zones to clean.
+        :return: True on success, otherwise False.
+        """
+        return self.__call(False, self.vacuum.start_zone_cleaning, zones)
+
+    def set_fan_level(self, fan_level: XVCHelperBase.FanLevel) -> bool:
+        """
+        Sets the fan level.
+
+        :param fan_level: New fan level.
+        :return: True on success, otherwise False.
+        """
+        return self.__call(False, self.vacuum.set_fan_level, fan_level)
+
+    def battery(self) -> Tuple[bool, int]:
+        """
+        Gets the battery level.
+
+        :return: True on success, otherwise False.
+        :return: Battery level in percent.
+        """
+        return self.__call((False, None), self.vacuum.battery)
+
+    def detailed_status(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets detailed status (state, battery, error, fan speed, area, time).
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        return self.__call((False, {}), self.vacuum.detailed_status)
+
+    def last_run(self) -> Tuple[bool, float, float]:
+        """
+        Gets duration and area of the current or last cleaning run reported by the vacuum cleaner.
+
+        :return: True on success, otherwise False.
+        :return: Duration in seconds.
+        :return: Area in square meters.
+        """
+        return self.__call((False, 0, 0), self.vacuum.last_run)
+
+    def consumables(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets remaining lifetime of the consumables.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        return self.__call((False, {}), self.vacuum.consumables)
+
+    def clean_summary(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the summary of all cleaning runs.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        return self.__call((False, {}), self.vacuum.clean_summary)
+
+    def dnd(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Gets the do not disturb settings.
+
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        return self.__call((False, {}), self.vacuum.dnd)
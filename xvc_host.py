@@ -0,0 +1,236 @@
+import logging
+import signal
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Callable, Dict, List
+
+from telegram import Update
+from telegram.ext import Updater, CallbackContext, TypeHandler
+from telegram.utils.request import Request
+
+from xvc_metrics import Metrics
+from xvc_persistence import JournalPersistence
+from xvc_report import REPORT_PARTS
+
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+DEVICE_WORKERS = 8
+# all parts of a report are read at the same time
+DEVICE_CALLS_PER_TENANT = len(REPORT_PARTS)
+CONNECTIONS_PER_TENANT = 5
+METRICS_INTERVAL = 300
+# updates are counted before the access gate rejects them
+COUNT_GROUP = -3
+
+
+class TenantExecutor(Executor):
+    """
+    Limits the device calls of one tenant on the shared executor.
+    Calls above the limit are queued per tenant and started as soon as a running call finished,
+    so a tenant with an unresponsive vacuum cleaner occupies at most its own share of the device workers.
+    """
+
+    def __init__(self, executor: Executor, limit: int = DEVICE_CALLS_PER_TENANT) -> None:
+        """
+        Initialize an object of class TenantExecutor.
+
+        :param executor: Shared executor.
+        :param limit: Maximum number of concurrent device calls of the tenant.
+        """
+        self.__executor = executor
+        self.__limit = limit
+        self.__running = 0
+        self.__pending = deque()
+        self.__lock = Lock()
+
+    def submit(self, fn: Callable, *args: List, **kwargs: Dict) -> Future:
+        """
+        Submits a device call without blocking, the call is queued if all slots of the tenant are busy.
+
+        :param fn: Function to call.
+        :param args: Arguments of the function.
+        :param kwargs: Keyword arguments of the function.
+        :return: Future of the call, a queued call can be cancelled.
+        """
+        future = Future()
+        with self.__lock:
+            if self.__running >= self.__limit:
+                self.__pending.append((future, fn, args, kwargs))
+                return future
+            self.__running += 1
+        self.__start(future, fn, args, kwargs)
+        return future
+
+    def __start(self, future: Future, fn: Callable, args: tuple, kwargs: Dict) -> None:
+        """
+        Starts a device call on the shared executor, the slot is already taken.
+
+        :param future: Future of the call.
+        :param fn: Function to call.
+        :param args: Arguments of the function.
+        :param kwargs: Keyword arguments of the function.
+        """
+        try:
+            self.__executor.submit(self.__run, future, fn, args, kwargs)
+        except RuntimeError as ex:
+            # the shared executor was shut down
+            if future.set_running_or_notify_cancel():
+                future.set_exception(ex)
+            self.__release()
+
+    def __run(self, future: Future, fn: Callable, args: tuple, kwargs: Dict) -> None:
+        """
+        Runs a device call on a worker of the shared executor and frees the slot afterwards.
+
+        :param future: Future of the call.
+        :param fn: Function to call.
+        :param args: Arguments of the function.
+        :param kwargs: Keyword arguments of the function.
+        """
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as ex:
+                    future.set_exception(ex)
+                else:
+                    future.set_result(result)
+        finally:
+            self.__release()
+
+    def __release(self) -> None:
+        """
+        Frees a slot or hands it over to the next queued call which was not cancelled.
+        """
+        with self.__lock:
+            while self.__pending:
+                entry = self.__pending.popleft()
+                if not entry[0].cancelled():
+                    break
+            else:
+                self.__running -= 1
+                return
+        self.__start(*entry)
+
+    def shutdown(self, wait: bool = True, **kwargs: Dict) -> None:
+        """
+        The shared executor is shut down by the host.
+
+        :param wait: Unused parameter.
+        :param kwargs: Unused parameters.
+        """
+        pass
+
+
+class XVCHost(object):
+    """
+    Hosts several bots in one process.
+    All bots share one executor for device calls, one connection pool for the Telegram Bot API and one metrics
+    surface, failures are isolated per tenant.
+    """
+
+    def __init__(self, device_workers: int = DEVICE_WORKERS, tenants: int = 1) -> None:
+        """
+        Initialize an object of class XVCHost.
+
+        :param device_workers: Minimum number of threads for device calls.
+        :param tenants: Expected number of tenants to size the device threads and the connection pool.
+        """
+        # every tenant gets its full share, so unresponsive vacuum cleaners cannot starve the other tenants
+        self.executor = ThreadPoolExecutor(max_workers=max(device_workers, tenants * DEVICE_CALLS_PER_TENANT),
+                                           thread_name_prefix='device')
+        self.request = Request(con_pool_size=max(tenants, 1) * CONNECTIONS_PER_TENANT)
+        self.metrics = Metrics()
+        self.__updaters = {}
+        self.__stop_event = Event()
+
+    def add_tenant(self, tenant: str, updater: Updater) -> None:
+        """
+        Adds the updater of a tenant and counts its updates and errors.
+
+        :param tenant: Name of the tenant.
+        :param updater: Updater with registered handlers.
+        """
+
+        def count_update(_: Update, __: CallbackContext) -> None:
+            self.metrics.increment(tenant, 'updates')
+
+        def count_error(_: object, context: CallbackContext) -> None:
+            self.metrics.increment(tenant, 'errors')
+            logger.error('Tenant {}: {}'.format(tenant, context.error), exc_info=context.error)
+
+        updater.dispatcher.add_handler(TypeHandler(Update, count_update), group=COUNT_GROUP)
+        updater.dispatcher.add_error_handler(count_error)
+        self.__updaters[tenant] = updater
+
+    def create_executor(self) -> TenantExecutor:
+        """
+        Creates the executor for the device calls of one tenant.
+
+        :return: Executor which limits the tenant on the shared executor.
+        """
+        return TenantExecutor(self.executor)
+
+    @staticmethod
+    def close_persistence(updater: Updater) -> None:
+        """
+        Writes the remaining journal records of a tenant and stops its writer thread.
+
+        :param updater: Updater of the tenant.
+        """
+        if isinstance(updater.dispatcher.persistence, JournalPersistence):
+            updater.dispatcher.persistence.close()
+
+    @property
+    def tenants(self) -> Dict[str, Updater]:
+        """
+        Gets all hosted tenants.
+
+        :return: Dictionary with tenant names and updaters.
+        """
+        return dict(self.__updaters)
+
+    def start(self) -> None:
+        """
+        Starts polling of all tenants, a tenant which cannot be started is skipped.
+        """
+        for tenant, updater in list(self.__updaters.items()):
+            try:
+                updater.start_polling()
+                logger.info('Tenant {}: started'.format(tenant))
+            except Exception as ex:
+                logger.error('Tenant {}: cannot start polling: {}'.format(tenant, ex))
+                self.metrics.increment(tenant, 'start_failures')
+                XVCHost.close_persistence(updater)
+                del self.__updaters[tenant]
+
+    def idle(self, interval: float = METRICS_INTERVAL) -> None:
+        """
+        Blocks until SIGINT or SIGTERM is received and logs the metrics periodically.
+
+        :param interval: Interval in seconds to log the metrics.
+        """
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.__stop_event.set())
+        while not self.__stop_event.wait(interval):
+            logger.info('Metrics:\n{}'.format(self.metrics.render()))
+        self.stop()
+
+    def stop(self) -> None:
+        """
+        Stops all tenants, the shared executor and the shared connection pool.
+        """
+        self.__stop_event.set()
+        for tenant, updater in self.__updaters.items():
+            logger.info('Tenant {}: stop'.format(tenant))
+            if updater.dispatcher.persistence is not None:
+                # write the latest states before the dispatcher stops
+                updater.dispatcher.update_persistence()
+                updater.dispatcher.persistence.flush()
+            updater.stop()
+            XVCHost.close_persistence(updater)
+        self.executor.shutdown(wait=False)
+        self.request.stop()
@@ -0,0 +1,536 @@
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from collections import defaultdict, OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import wraps
+from itertools import count
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Tuple
+
+from telegram import Bot, Update
+from telegram.ext import Dispatcher
+from telegram.utils.request import Request
+
+from access_manager import AccessManager
+from json_parser import ConfigurationParser
+from main import register_handlers, wrap_callbacks
+from xvc_bot import XVCBot, FAN_BUTTONS, SKIP_BUTTON
+from xvc_helper import XVCHelperBase, XVCHelperSimulator
+from xvc_host import XVCHost
+from xvc_util import XVCListable
+
+# constants
+STUB_TOKEN = '123456:LOAD-TEST'
+TENANT = 'load'
+DENIED_USER_OFFSET = 1000000
+PERCENTILES = [50, 95, 99]
+ERROR_REPLIES = ['Error', 'Cannot establish connection to vacuum cleaner!']
+
+
+class LoadStatistics(object):
+    """
+    Thread safe collection of handler latencies and counters.
+    Latencies are measured from putting the update into the update queue.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an object of class LoadStatistics.
+        """
+        self.__latencies = defaultdict(list)
+        self.__counters = defaultdict(int)
+        self.__pending = {}
+        self.__lock = Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Records the latency of a handler.
+
+        :param name: Name of the handler.
+        :param seconds: Latency in seconds.
+        """
+        with self.__lock:
+            self.__latencies[name].append(seconds)
+
+    def increment(self, name: str) -> None:
+        """
+        Increments a counter.
+
+        :param name: Name of the counter.
+        """
+        with self.__lock:
+            self.__counters[name] += 1
+
+    def counter(self, name: str) -> int:
+        """
+        Gets the value of a counter.
+
+        :param name: Name of the counter.
+        :return: Value of the counter.
+        """
+        with self.__lock:
+            return self.__counters[name]
+
+    def enqueue(self, update: Update) -> Event:
+        """
+        Tracks an update which is put into the update queue.
+
+        :param update: Bot update.
+        :return: Event which is set as soon as the update was processed.
+        """
+        event = Event()
+        with self.__lock:
+            self.__pending[update.update_id] = (time.perf_counter(), event)
+        return event
+
+    def enqueued(self, update: Update) -> float:
+        """
+        Gets the time an update was put into the update queue.
+
+        :param update: Bot update.
+        :return: Performance counter at enqueue or None if the update is not tracked.
+        """
+        with self.__lock:
+            entry = self.__pending.get(update.update_id)
+        return entry[0] if entry is not None else None
+
+    def processed(self, update: Update) -> None:
+        """
+        Records the latency of a processed update and wakes up its user.
+
+        :param update: Bot update.
+        """
+        with self.__lock:
+            entry = self.__pending.pop(update.update_id, None)
+        if entry is not None:
+            self.record('update', time.perf_counter() - entry[0])
+            entry[1].set()
+
+    def timed(self, callback: Callable) -> Callable:
+        """
+        Wraps a handler callback to record its latency from enqueue until the handler replied.
+
+        :param callback: Handler callback.
+        :return: Wrapped callback.
+        """
+
+        @wraps(callback)
+        def wrapper(*args: List, **kwargs: Dict):
+            start = time.perf_counter()
+            for arg in args:
+                if isinstance(arg, Update):
+                    enqueued = self.enqueued(arg)
+                    if enqueued is not None:
+                        start = enqueued
+                    break
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                self.record(callback.__name__, time.perf_counter() - start)
+
+        return wrapper
+
+    @staticmethod
+    def percentile(values: List[float], percent: int) -> float:
+        """
+        Calculates a percentile with the nearest rank method.
+
+        :param values: Sorted values.
+        :param percent: Percentile.
+        :return: Value of the percentile.
+        """
+        index = max(int(round(percent / 100 * len(values) + 0.5)) - 1, 0)
+        return values[min(index, len(values) - 1)]
+
+    def latencies(self) -> Dict[str, Dict[str, float]]:
+        """
+        Gets the latency percentiles of all handlers.
+
+        :return: Dictionary with handler names and their percentiles in seconds.
+        """
+        result = OrderedDict()
+        with self.__lock:
+            latencies = {name: sorted(values) for name, values in self.__latencies.items()}
+        for name in sorted(latencies.keys()):
+            values = latencies[name]
+            result[name] = OrderedDict([('count', len(values))] +
+                                       [('p{}'.format(percent), LoadStatistics.percentile(values, percent))
+                                        for percent in PERCENTILES])
+        return result
+
+
+class StubRequest(Request):
+    """
+    Offline replacement of the Telegram Bot API.
+    Every request is answered locally, replies to the users are counted.
+    """
+    __slots__ = ('__statistics', '__message_ids')
+
+    def __init__(self, statistics: LoadStatistics) -> None:
+        """
+        Initialize an object of class StubRequest.
+
+        :param statistics: Statistics to count replies.
+        """
+        super().__init__()
+        self.__statistics = statistics
+        self.__message_ids = count(1)
+
+    def __message(self, data: Dict) -> Dict:
+        """
+        Creates a sent message.
+
+        :param data: Request data.
+        :return: Message as JSON dictionary.
+        """
+        return {'message_id': next(self.__message_ids),
+                'date': int(time.time()),
+                'chat': {'id': data.get('chat_id'), 'type': 'private'}}
+
+    def post(self, url: str, data: Dict, timeout: float = None) -> object:
+        """
+        Answers a Bot API request.
+
+        :param url: URL of the request.
+        :param data: Request data.
+        :param timeout: Unused parameter.
+        :return: Result of the request.
+        """
+        endpoint = url.rsplit('/', 1)[-1]
+        self.__statistics.increment('api_{}'.format(endpoint))
+        if endpoint == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+        if endpoint == 'sendMessage':
+            text = data.get('text', '')
+            if text in ERROR_REPLIES:
+                self.__statistics.increment('error_replies')
+            message = self.__message(data)
+            message['text'] = text
+            return message
+        if endpoint == 'sendPhoto':
+            message = self.__message(data)
+            message['photo'] = [{'file_id': 'load-test-photo', 'file_unique_id': 'load-test-photo',
+                                 'width': 512, 'height': 512}]
+            return message
+        return True
+
+
+class LoadDispatcher(Dispatcher):
+    """
+    Dispatcher which reports every processed update to the statistics.
+    """
+    __slots__ = ('__statistics',)
+
+    def __init__(self, bot: Bot, update_queue: Queue, statistics: LoadStatistics, **kwargs: Dict) -> None:
+        """
+        Initialize an object of class LoadDispatcher.
+
+        :param bot: Bot with stubbed Telegram Bot API.
+        :param update_queue: Update queue.
+        :param statistics: Statistics to record latencies.
+        :param kwargs: Arguments of the dispatcher.
+        """
+        super().__init__(bot, update_queue, **kwargs)
+        self.__statistics = statistics
+
+    def process_update(self, update: object) -> None:
+        """
+        Processes an update and marks it as processed.
+
+        :param update: Bot update.
+        """
+        try:
+            super().process_update(update)
+        finally:
+            if isinstance(update, Update):
+                self.__statistics.processed(update)
+
+
+class LatencyVacuum(XVCHelperSimulator):
+    """
+    Simulated vacuum cleaner with injected latency for every call.
+    """
+
+    def __init__(self, latency: float, jitter: float = 0.0) -> None:
+        """
+        Initialize an object of class LatencyVacuum.
+
+        :param latency: Latency of every call in seconds.
+        :param jitter: Maximum random deviation of the latency in seconds.
+        """
+        super().__init__('127.0.0.1', 'load')
+        self.__latency = latency
+        self.__jitter = jitter
+
+    def __delay(self) -> None:
+        """
+        Sleeps for the injected latency.
+        """
+        delay = self.__latency + random.uniform(-self.__jitter, self.__jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def status(self) -> Tuple[bool, str]:
+        self.__delay()
+        return super().status()
+
+    def pause(self) -> bool:
+        self.__delay()
+        return super().pause()
+
+    def home(self) -> bool:
+        self.__delay()
+        return super().home()
+
+    def start_zone_cleaning(self, zones: List[XVCListable]) -> bool:
+        self.__delay()
+        return super().start_zone_cleaning(zones)
+
+    def set_fan_level(self, fan_level: XVCHelperBase.FanLevel) -> bool:
+        self.__delay()
+        return super().set_fan_level(fan_level)
+
+    def battery(self) -> Tuple[bool, int]:
+        self.__delay()
+        return super().battery()
+
+    def detailed_status(self) -> Tuple[bool, Dict[str, str]]:
+        self.__delay()
+        return super().detailed_status()
+
+    def last_run(self) -> Tuple[bool, float, float]:
+        self.__delay()
+        return super().last_run()
+
+    def consumables(self) -> Tuple[bool, Dict[str, str]]:
+        self.__delay()
+        return super().consumables()
+
+    def clean_summary(self) -> Tuple[bool, Dict[str, str]]:
+        self.__delay()
+        return super().clean_summary()
+
+    def dnd(self) -> Tuple[bool, Dict[str, str]]:
+        self.__delay()
+        return super().dnd()
+
+
+def create_dispatcher(config: str, vacuum: XVCHelperBase, statistics: LoadStatistics,
+                      executor: Executor = None) -> Dispatcher:
+    """
+    Creates a dispatcher with the same handlers as the bot and a stubbed Telegram Bot API.
+
+    :param config: Path to configuration file with the cleaning zones.
+    :param vacuum: Reference to vacuum cleaner.
+    :param statistics: Statistics to record latencies and counters.
+    :param executor: Executor for the device calls like the one of a hosted tenant, default is None.
+    :return: Dispatcher.
+    """
+    parser = ConfigurationParser(config)
+    zones = parser.parse_zones()
+    rectangles = list(parser.parse_doors().values()) + list(parser.parse_rooms().values()) + \
+        list(parser.parse_areas().values())
+    xvc_bot = XVCBot(vacuum, zones, tenant=TENANT, executor=executor, rectangles=rectangles)
+
+    bot = Bot(STUB_TOKEN, request=StubRequest(statistics))
+    dispatcher = LoadDispatcher(bot, Queue(), statistics, workers=1, use_context=True)
+    register_handlers(dispatcher, xvc_bot, zones, TENANT, statistics.increment)
+    dispatcher.add_error_handler(lambda _, __: statistics.increment('errors'))
+
+    for handlers in dispatcher.handlers.values():
+        wrap_callbacks(handlers, statistics.timed)
+    return dispatcher
+
+
+def create_message(update_id: int, user_id: int, text: str) -> Dict:
+    """
+    Creates an update with a private text message.
+
+    :param update_id: Id of the update.
+    :param user_id: Id of the user and chat.
+    :param text: Message text.
+    :return: Update as JSON dictionary.
+    """
+    message = {'message_id': update_id,
+               'date': int(time.time()),
+               'chat': {'id': user_id, 'type': 'private'},
+               'from': {'id': user_id, 'is_bot': False, 'first_name': 'User{}'.format(user_id)},
+               'text': text}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def synthetic_updates(config: str, users: int, denied: float, seed: int = None) -> List[Dict]:
+    """
+    Creates the zone cleaning conversation (/start, ZoneCleaning, fan, zone) and a /report for many users.
+
+    :param config: Path to configuration file with the cleaning zones.
+    :param users: Number of users.
+    :param denied: Fraction of users without access.
+    :param seed: Seed of the random generator, default is None.
+    :return: List of updates as JSON dictionaries.
+    """
+    generator = random.Random(seed)
+    zones = [zone.title() for zone in ConfigurationParser(config).parse_zones().keys()]
+    update_ids = count(1)
+    updates = []
+    for user in range(1, users + 1):
+        user_id = user + DENIED_USER_OFFSET if generator.random() < denied else user
+        for text in ['/start', 'ZoneCleaning', generator.choice(FAN_BUTTONS + SKIP_BUTTON), generator.choice(zones),
+                     '/report']:
+            updates.append(create_message(next(update_ids), user_id, text))
+    return updates
+
+
+def write_recording(path: str, updates: List[Dict], allowed_users: List[int]) -> None:
+    """
+    Writes updates to a JSON lines file, the first line holds the user ids with access.
+
+    :param path: Path of the recording.
+    :param updates: List of updates as JSON dictionaries.
+    :param allowed_users: List with user ids with access.
+    """
+    with open(path, 'w') as file:
+        file.write(json.dumps({'allowed_users': list(allowed_users)}) + '\n')
+        file.writelines(json.dumps(data) + '\n' for data in updates)
+
+
+def read_recording(path: str) -> Tuple[List[Dict], List[int]]:
+    """
+    Reads updates from a JSON lines file.
+    Without stored user ids, the senders with ids below DENIED_USER_OFFSET get access like in synthetic runs.
+
+    :param path: Path of the recording.
+    :return: List of updates as JSON dictionaries.
+    :return: List with user ids with access.
+    """
+    updates = []
+    allowed_users = None
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if 'allowed_users' in data:
+                allowed_users = data['allowed_users']
+            else:
+                updates.append(data)
+    if allowed_users is None:
+        senders = {(data.get('message') or {}).get('from', {}).get('id') for data in updates}
+        allowed_users = sorted(user for user in senders if user is not None and user < DENIED_USER_OFFSET)
+    return updates, allowed_users
+
+
+def run(dispatcher: Dispatcher, updates: List[Dict], concurrency: int, statistics: LoadStatistics) -> float:
+    """
+    Feeds the updates into the update queue of the running dispatcher like the updater in production.
+    Every user sends the next update after the previous one was processed.
+
+    :param dispatcher: Dispatcher.
+    :param updates: List of updates as JSON dictionaries.
+    :param concurrency: Number of users sending updates at the same time.
+    :param statistics: Statistics to track the enqueued updates.
+    :return: Wall time in seconds.
+    """
+    per_user = OrderedDict()
+    for data in updates:
+        update = Update.de_json(data, dispatcher.bot)
+        per_user.setdefault(update.effective_user.id, []).append(update)
+
+    def send(user_updates: List[Update]) -> None:
+        for user_update in user_updates:
+            processed = statistics.enqueue(user_update)
+            dispatcher.update_queue.put(user_update)
+            processed.wait()
+
+    ready = Event()
+    thread = Thread(target=dispatcher.start, kwargs={'ready': ready}, name='dispatcher', daemon=True)
+    thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load') as executor:
+            list(executor.map(send, per_user.values()))
+        return time.perf_counter() - start
+    finally:
+        dispatcher.stop()
+        thread.join()
+
+
+def main():
+    arguments = argparse.ArgumentParser(description='Offline load test of the bot dispatcher')
+    arguments.add_argument('--config', default='example_config.json', help='configuration file with cleaning zones')
+    arguments.add_argument('--replay', help='JSON lines file with recorded updates')
+    arguments.add_argument('--record', help='write the synthetic updates to a JSON lines file')
+    arguments.add_argument('--allow', type=int, nargs='+',
+                           help='user ids with access for replayed updates, default are the ids of the recording')
+    arguments.add_argument('--users', type=int, default=100, help='number of synthetic users')
+    arguments.add_argument('--denied', type=float, default=0.1, help='fraction of synthetic users without access')
+    arguments.add_argument('--seed', type=int, help='seed for the synthetic updates')
+    arguments.add_argument('--concurrency', type=int, default=16, help='number of users processed at the same time')
+    arguments.add_argument('--latency', type=float, default=0.05, help='injected device latency in seconds')
+    arguments.add_argument('--jitter', type=float, default=0.0, help='random deviation of the device latency')
+    arguments.add_argument('--max-errors', type=int, default=0, help='fail if more errors occur')
+    arguments.add_argument('--max-p99', type=float, help='fail if a handler p99 latency exceeds this value')
+    arguments.add_argument('--json', action='store_true', help='print the result as JSON')
+    args = arguments.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.replay:
+        updates, allowed_users = read_recording(args.replay)
+        if args.allow is not None:
+            allowed_users = args.allow
+    else:
+        updates = synthetic_updates(args.config, args.users, args.denied, args.seed)
+        allowed_users = list(range(1, args.users + 1))
+        if args.record:
+            write_recording(args.record, updates, allowed_users)
+    AccessManager.add_users(allowed_users, TENANT)
+
+    statistics = LoadStatistics()
+    # device calls take the same path as in production: proxy, tenant executor and shared pool of the host
+    host = XVCHost()
+    dispatcher = create_dispatcher(args.config, LatencyVacuum(args.latency, args.jitter), statistics,
+                                   host.create_executor())
+    try:
+        wall_time = run(dispatcher, updates, args.concurrency, statistics)
+    finally:
+        host.stop()
+
+    latencies = statistics.latencies()
+    result = OrderedDict([('updates', len(updates)),
+                          ('wall_time', wall_time),
+                          ('throughput', len(updates) / wall_time if wall_time > 0 else 0.0),
+                          ('errors', statistics.counter('errors')),
+                          ('error_replies', statistics.counter('error_replies')),
+                          ('denials', statistics.counter('denials')),
+                          ('rate_limited', statistics.counter('rate_limited')),
+                          ('handlers', latencies)])
+
+    if args.json:
+        print(json.dumps(result, indent=4))
+    else:
+        print('Updates: {}, wall time: {:.3f}s, throughput: {:.1f} updates/s'.format(
+            result['updates'], result['wall_time'], result['throughput']))
+        print('Errors: {}, error replies: {}, denials: {}, rate limited: {}'.format(
+            result['errors'], result['error_replies'], result['denials'], result['rate_limited']))
+        for name, values in latencies.items():
+            print('{:>15}: {:6d} calls, '.format(name, values['count']) +
+                  ', '.join('p{} {:.1f}ms'.format(percent, values['p{}'.format(percent)] * 1000)
+                            for percent in PERCENTILES))
+
+    failed = result['errors'] > args.max_errors
+    if args.max_p99 is not None:
+        failed |= any(values['p99'] > args.max_p99 for values in latencies.values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
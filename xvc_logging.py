@@ -0,0 +1,101 @@
+import copy
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import Queue
+
+from json_parser import Configuration
+
+# constants
+LOG_FORMAT = '%(asctime)23s - %(levelname)8s - %(name)25s - %(funcName)25s - %(message)s'
+STRUCTURED_FIELDS = ['chat_id', 'command', 'latency']
+EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formatter to write one JSON object per log record.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Formats the log record as a JSON line.
+
+        :param record: Log record.
+        :return: JSON line.
+        """
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'function': record.funcName,
+            'message': record.getMessage()
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry)
+
+
+class PreparedQueueHandler(QueueHandler):
+    """
+    Queue handler which keeps the formatted traceback separate from the message.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Prepares the log record for the queue on the producer side.
+
+        :param record: Log record.
+        :return: Copy of the log record with merged arguments and formatted traceback.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(settings: Configuration.LoggingSettings) -> QueueListener:
+    """
+    Configures the logging pipeline.
+    All records are put into a queue and written to the console and a rotating log file by a background listener.
+
+    :param settings: Logging settings.
+    :return: Started queue listener, stop it on shutdown to flush pending records.
+    """
+    if settings.json:
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(LOG_FORMAT)
+
+    console_logging = logging.StreamHandler()
+    console_logging.setLevel(logging.ERROR)
+    console_logging.setFormatter(formatter)
+
+    file_logging = RotatingFileHandler(settings.file,
+                                       maxBytes=settings.max_bytes,
+                                       backupCount=settings.backup_count)
+    file_logging.setLevel(logging.NOTSET)
+    file_logging.setFormatter(formatter)
+
+    log_queue = Queue()
+    listener = QueueListener(log_queue, console_logging, file_logging, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(PreparedQueueHandler(log_queue))
+    root.setLevel(settings.level)
+
+    for name, level in settings.levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    return listener
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+from io import BytesIO
+from threading import Lock
+from typing import Dict, List
+
+from xvc_util import Rectangle, Door, Room, Area
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+    ImageDraw = None
+
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+MAP_SIZE = 512
+MAP_BORDER = 16
+MAP_BACKGROUND = (255, 255, 255)
+MAP_COLORS = {
+    Door: (160, 160, 160),
+    Room: (100, 150, 230),
+    Area: (120, 200, 120)
+}
+MAP_HIGHLIGHT = (230, 90, 60)
+
+
+class ZoneMap(object):
+    """
+    Renders the cleaning zones into a PNG image.
+    Rendered images are cached by a content hash of the zone configuration and the selected zone.
+    """
+
+    def __init__(self, zones: Dict[str, List[Rectangle]], rectangles: List[Rectangle] = None) -> None:
+        """
+        Initialize an object of class ZoneMap.
+
+        :param zones: Dictionary with all cleaning zones.
+        :param rectangles: List with all doors, rooms and areas, default are the rectangles of the zones.
+        """
+        self.__zones = zones
+        unique = {}
+        for rectangle in list(rectangles or []) + [element for elements in zones.values() for element in elements]:
+            unique.setdefault(ZoneMap.identify(rectangle), rectangle)
+        self.__rectangles = list(unique.values())
+        self.__hash = ZoneMap.hash_zones(zones, self.__rectangles)
+        self.__images = {}
+        self.__lock = Lock()
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Checks if the image library is installed.
+
+        :return: True if maps can be rendered, otherwise False.
+        """
+        return Image is not None
+
+    @staticmethod
+    def identify(rectangle: Rectangle) -> tuple:
+        """
+        Identifies a rectangle by its content, the parser creates new objects on every call.
+
+        :param rectangle: Door, room or area.
+        :return: Type, name and coordinates of the rectangle.
+        """
+        return type(rectangle).__name__, (rectangle.name or '').upper(), tuple(rectangle.get_list())
+
+    @staticmethod
+    def hash_zones(zones: Dict[str, List[Rectangle]], rectangles: List[Rectangle] = None) -> str:
+        """
+        Creates a content hash of the zone configuration.
+
+        :param zones: Dictionary with all cleaning zones.
+        :param rectangles: List with all drawn rectangles, default is None.
+        :return: Hex digest of the zone configuration.
+        """
+        content = hashlib.sha1()
+        for rectangle in rectangles or []:
+            content.update(str(rectangle).encode())
+            content.update(str(rectangle.get_list()).encode())
+        for name in sorted(zones.keys()):
+            content.update(name.encode())
+            for rectangle in zones[name]:
+                content.update(str(rectangle).encode())
+                content.update(str(rectangle.get_list()).encode())
+        return content.hexdigest()
+
+    def key(self, selected: str = None) -> str:
+        """
+        Creates the cache key of an image.
+
+        :param selected: Name of the highlighted zone, default is None.
+        :return: Cache key.
+        """
+        return '{}:{}'.format(self.__hash, selected.upper() if selected else '')
+
+    def render(self, selected: str = None) -> bytes:
+        """
+        Renders all rectangles and highlights the rectangles of the selected zone.
+
+        :param selected: Name of the highlighted zone, default is None.
+        :return: PNG image.
+        """
+        key = self.key(selected)
+        with self.__lock:
+            if key not in self.__images:
+                logger.debug('Render zone map {}'.format(key))
+                self.__images[key] = self.__draw(self.__zones.get(selected.upper(), []) if selected else [])
+            return self.__images[key]
+
+    def __draw(self, highlighted: List[Rectangle]) -> bytes:
+        """
+        Draws the rectangles into a PNG image.
+
+        :param highlighted: Rectangles to highlight.
+        :return: PNG image.
+        """
+        image = Image.new('RGB', (MAP_SIZE, MAP_SIZE), MAP_BACKGROUND)
+        draw = ImageDraw.Draw(image)
+
+        if self.__rectangles:
+            points = [point for rectangle in self.__rectangles
+                      for point in (rectangle.bottom_left, rectangle.top_right)]
+            xs = [int(point.x) for point in points]
+            ys = [int(point.y) for point in points]
+            min_x, max_x = min(xs), max(xs)
+            min_y, max_y = min(ys), max(ys)
+            scale = (MAP_SIZE - 2 * MAP_BORDER) / max(max_x - min_x, max_y - min_y, 1)
+
+            def transform(x: int, y: int) -> tuple:
+                # the vacuum cleaner has its origin at the bottom, the image at the top
+                return (MAP_BORDER + (int(x) - min_x) * scale,
+                        MAP_SIZE - MAP_BORDER - (int(y) - min_y) * scale)
+
+            highlighted_ids = {ZoneMap.identify(rectangle) for rectangle in highlighted}
+            # doors are drawn last, they usually overlap rooms
+            for rectangle in sorted(self.__rectangles, key=lambda element: isinstance(element, Door)):
+                x1, y1 = transform(rectangle.bottom_left.x, rectangle.bottom_left.y)
+                x2, y2 = transform(rectangle.top_right.x, rectangle.top_right.y)
+                # the corners may be configured in any order
+                left, right = min(x1, x2), max(x1, x2)
+                top, bottom = min(y1, y2), max(y1, y2)
+                color = MAP_HIGHLIGHT if ZoneMap.identify(rectangle) in highlighted_ids else MAP_COLORS[type(rectangle)]
+                draw.rectangle([left, top, right, bottom], fill=color, outline=(0, 0, 0))
+                draw.text((left + 2, top + 2), rectangle.name or '', fill=(0, 0, 0))
+
+        data = BytesIO()
+        image.save(data, format='PNG')
+        return data.getvalue()
@@ -0,0 +1,51 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Dict
+
+
+class Metrics(object):
+    """
+    Thread safe counters shared by all hosted bots.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an object of class Metrics.
+        """
+        self.__counters = defaultdict(int)
+        self.__lock = Lock()
+
+    def increment(self, tenant: str, name: str, value: int = 1) -> None:
+        """
+        Increments a counter.
+
+        :param tenant: Name of the tenant.
+        :param name: Name of the counter.
+        :param value: Value to add, default is 1.
+        """
+        with self.__lock:
+            self.__counters[(tenant, name)] += value
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        Gets a copy of all counters.
+
+        :return: Dictionary with tenants and their counters.
+        """
+        result = defaultdict(dict)
+        with self.__lock:
+            for (tenant, name), value in self.__counters.items():
+                result[tenant][name] = value
+        return dict(result)
+
+    def render(self) -> str:
+        """
+        Renders all counters in one line per tenant.
+
+        :return: Text with all counters.
+        """
+        lines = []
+        for tenant, counters in sorted(self.snapshot().items()):
+            lines.append('{}: {}'.format(tenant, ', '.join('{}={}'.format(name, value)
+                                                            for name, value in sorted(counters.items()))))
+        return '\n'.join(lines)
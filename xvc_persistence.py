@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+from collections import defaultdict
+from queue import Queue
+from threading import Thread
+from typing import DefaultDict, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence
+from telegram.ext.utils.types import ConversationDict
+
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+SNAPSHOT_SUFFIX = '.snapshot'
+JOURNAL_SUFFIX = '.journal'
+COMPACT_RECORDS = 1000
+CLOSE_RECORD = {'type': 'close'}
+
+
+class JournalPersistence(BasePersistence):
+    """
+    Persists conversation states and chat data in an append-only journal.
+    The journal is written by a background thread and compacted into a snapshot periodically.
+    On startup the snapshot is loaded and the journal is replayed.
+    """
+    __slots__ = ('__path', '__compact_records', '__conversations', '__chat_data', '__queue', '__writer',
+                 '__mirror_conversations', '__mirror_chat_data', '__journal', '__records')
+
+    def __init__(self, path: str, compact_records: int = COMPACT_RECORDS) -> None:
+        """
+        Initialize an object of class JournalPersistence.
+
+        :param path: Path of the persistence files without suffix.
+        :param compact_records: Number of journal records after which the journal is compacted.
+        """
+        super().__init__(store_user_data=False, store_chat_data=True, store_bot_data=False)
+        self.__path = path
+        self.__compact_records = compact_records
+        self.__conversations, self.__chat_data, self.__records = JournalPersistence.load(path)
+        # the writer thread keeps its own copy to write snapshots without locking the request path
+        self.__mirror_conversations = {name: dict(states) for name, states in self.__conversations.items()}
+        self.__mirror_chat_data = {chat_id: dict(data) for chat_id, data in self.__chat_data.items()}
+        self.__journal = None
+        self.__queue = Queue()
+        self.__writer = Thread(target=self.__write, name='persistence', daemon=True)
+        self.__writer.start()
+
+    @staticmethod
+    def load(path: str) -> Tuple[Dict[str, ConversationDict], Dict[int, Dict], int]:
+        """
+        Loads the snapshot and replays the journal.
+
+        :param path: Path of the persistence files without suffix.
+        :return: Dictionary with conversation names and states.
+        :return: Dictionary with chat ids and chat data.
+        :return: Number of replayed journal records.
+        """
+        conversations = defaultdict(dict)
+        chat_data = {}
+        if os.path.exists(path + SNAPSHOT_SUFFIX):
+            with open(path + SNAPSHOT_SUFFIX) as file:
+                snapshot = json.load(file)
+            for name, states in snapshot.get('conversations', {}).items():
+                conversations[name] = {tuple(entry[0]): entry[1] for entry in states}
+            chat_data = {int(chat_id): data for chat_id, data in snapshot.get('chat_data', {}).items()}
+
+        records = 0
+        if os.path.exists(path + JOURNAL_SUFFIX):
+            with open(path + JOURNAL_SUFFIX) as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a crash may leave the last record incomplete
+                        logger.warning('Skip incomplete journal record')
+                        continue
+                    JournalPersistence.apply(conversations, chat_data, record)
+                    records += 1
+        logger.info('Loaded {} conversations and {} chats, {} journal records'.format(
+            sum(len(states) for states in conversations.values()), len(chat_data), records))
+        return conversations, chat_data, records
+
+    @staticmethod
+    def apply(conversations: Dict[str, ConversationDict], chat_data: Dict[int, Dict], record: Dict) -> None:
+        """
+        Applies a journal record.
+
+        :param conversations: Dictionary with conversation names and states.
+        :param chat_data: Dictionary with chat ids and chat data.
+        :param record: Journal record.
+        """
+        if record['type'] == 'conversation':
+            states = conversations.setdefault(record['name'], {})
+            key = tuple(record['key'])
+            if record['state'] is None:
+                states.pop(key, None)
+            else:
+                states[key] = record['state']
+        elif record['type'] == 'chat':
+            chat_data[record['id']] = record['data']
+
+    def __write(self) -> None:
+        """
+        Appends the queued records to the journal and compacts it.
+        """
+        self.__journal = open(self.__path + JOURNAL_SUFFIX, 'a')
+        while True:
+            record = self.__queue.get()
+            if record is CLOSE_RECORD:
+                self.__compact()
+                self.__journal.close()
+                self.__queue.task_done()
+                return
+            if record is not None:
+                try:
+                    line = json.dumps(record)
+                    JournalPersistence.apply(self.__mirror_conversations, self.__mirror_chat_data, record)
+                    self.__journal.write(line + '\n')
+                    self.__records += 1
+                except (OSError, TypeError, ValueError) as ex:
+                    logger.error('Cannot write journal record: {}'.format(ex))
+            # write several records at once if the queue is busy
+            if record is None or self.__queue.empty():
+                self.__journal.flush()
+            if record is None or self.__records >= self.__compact_records:
+                self.__compact()
+            self.__queue.task_done()
+
+    def __compact(self) -> None:
+        """
+        Writes a snapshot and truncates the journal.
+        """
+        if self.__records == 0:
+            return
+        snapshot = {
+            'conversations': {name: [[list(key), state] for key, state in states.items()]
+                              for name, states in self.__mirror_conversations.items()},
+            'chat_data': self.__mirror_chat_data
+        }
+        try:
+            with open(self.__path + SNAPSHOT_SUFFIX + '.tmp', 'w') as file:
+                json.dump(snapshot, file)
+            os.replace(self.__path + SNAPSHOT_SUFFIX + '.tmp', self.__path + SNAPSHOT_SUFFIX)
+            self.__journal.close()
+            self.__journal = open(self.__path + JOURNAL_SUFFIX, 'w')
+            self.__records = 0
+        except (OSError, TypeError) as ex:
+            logger.error('Cannot compact journal: {}'.format(ex))
+
+    def get_user_data(self) -> DefaultDict[int, Dict]:
+        """
+        User data is not stored.
+
+        :return: Empty user data.
+        """
+        return defaultdict(dict)
+
+    def get_chat_data(self) -> DefaultDict[int, Dict]:
+        """
+        Gets the loaded chat data.
+
+        :return: Dictionary with chat ids and chat data.
+        """
+        chat_data = defaultdict(dict)
+        chat_data.update((chat_id, dict(data)) for chat_id, data in self.__chat_data.items())
+        return chat_data
+
+    def get_bot_data(self) -> Dict:
+        """
+        Bot data is not stored.
+
+        :return: Empty bot data.
+        """
+        return {}
+
+    def get_conversations(self, name: str) -> ConversationDict:
+        """
+        Gets the loaded conversation states.
+
+        :param name: Name of the conversation handler.
+        :return: Dictionary with conversation keys and states.
+        """
+        return dict(self.__conversations.get(name, {}))
+
+    def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        """
+        Queues a changed conversation state for the journal.
+
+        :param name: Name of the conversation handler.
+        :param key: Conversation key.
+        :param new_state: New state or None if the conversation ended.
+        """
+        states = self.__conversations.setdefault(name, {})
+        if states.get(key) == new_state:
+            return
+        if new_state is None:
+            states.pop(key, None)
+        else:
+            states[key] = new_state
+        self.__queue.put({'type': 'conversation', 'name': name, 'key': list(key), 'state': new_state})
+
+    def update_user_data(self, user_id: int, data: Dict) -> None:
+        """
+        User data is not stored.
+
+        :param user_id: Unused parameter.
+        :param data: Unused parameter.
+        """
+        pass
+
+    def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        """
+        Queues changed chat data for the journal.
+
+        :param chat_id: Chat id.
+        :param data: Chat data.
+        """
+        if self.__chat_data.get(chat_id) == data:
+            return
+        self.__chat_data[chat_id] = data
+        self.__queue.put({'type': 'chat', 'id': chat_id, 'data': data})
+
+    def update_bot_data(self, data: Dict) -> None:
+        """
+        Bot data is not stored.
+
+        :param data: Unused parameter.
+        """
+        pass
+
+    def flush(self) -> None:
+        """
+        Writes all queued records and compacts the journal, called on shutdown.
+        """
+        if not self.__writer.is_alive():
+            return
+        self.__queue.put(None)
+        self.__queue.join()
+
+    def close(self) -> None:
+        """
+        Writes all queued records, compacts the journal and stops the writer thread.
+        """
+        if not self.__writer.is_alive():
+            return
+        self.__queue.put(CLOSE_RECORD)
+        self.__writer.join()
@@ -0,0 +1,211 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from functools import wraps
+from itertools import count
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Tuple
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from access_manager import AccessManager
+
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+PROFILE_DIRECTORY = 'profile'
+PROFILE_INTERVAL = 600
+PROFILE_SAMPLE = 10
+PROFILE_TOP = 30
+TRACEMALLOC_FRAMES = 10
+IMPORT_MODULES = ['telegram', 'telegram.ext', 'miio', 'json_parser']
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)$')
+
+
+def import_times(modules: List[str] = None) -> List[Tuple[str, int, int]]:
+    """
+    Measures the import time of modules in a fresh interpreter.
+
+    :param modules: Modules to import, default is IMPORT_MODULES.
+    :return: List with module name, self time and cumulative time in microseconds.
+    """
+    modules = modules if modules is not None else IMPORT_MODULES
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(modules)],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    result = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            result.append((match.group(3), int(match.group(1)), int(match.group(2))))
+    return result
+
+
+class Profiler(object):
+    """
+    Profiling mode for production diagnosis.
+    Samples handler calls with cProfile, tracks allocations with tracemalloc and dumps both periodically.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIRECTORY, sample: int = PROFILE_SAMPLE,
+                 interval: float = PROFILE_INTERVAL, top: int = PROFILE_TOP) -> None:
+        """
+        Initialize an object of class Profiler.
+
+        :param directory: Directory for the dump files.
+        :param sample: Every n-th handler call is profiled.
+        :param interval: Interval in seconds to dump the profiles, 0 disables the timer.
+        :param top: Number of entries in the text summaries.
+        """
+        self.__directory = directory
+        self.__sample = max(sample, 1)
+        self.__interval = interval
+        self.__top = top
+        self.__calls = count()
+        self.__stats = None
+        self.__lock = Lock()
+        self.__profiling = Lock()
+        self.__stop_event = Event()
+        self.__timer = None
+
+    def start(self) -> None:
+        """
+        Starts allocation tracking and the dump timer, and writes the import time breakdown.
+        """
+        os.makedirs(self.__directory, exist_ok=True)
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.__write_import_times()
+        if self.__interval > 0:
+            self.__timer = Thread(target=self.__run, name='profiler', daemon=True)
+            self.__timer.start()
+        logger.info('Profiling enabled, dumps in {}'.format(self.__directory))
+
+    def stop(self) -> None:
+        """
+        Stops the dump timer, writes a last dump and stops allocation tracking.
+        """
+        self.__stop_event.set()
+        self.dump()
+        tracemalloc.stop()
+
+    def __run(self) -> None:
+        """
+        Dumps the profiles periodically.
+        """
+        while not self.__stop_event.wait(self.__interval):
+            self.dump()
+
+    def __path(self, name: str) -> str:
+        """
+        Creates the path of a dump file.
+
+        :param name: Name of the dump file.
+        :return: Path of the dump file.
+        """
+        return os.path.join(self.__directory, '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), name))
+
+    def __write_import_times(self) -> None:
+        """
+        Writes the import time breakdown of the startup modules.
+        """
+        path = self.__path('imports.txt')
+        entries = import_times()
+        cumulative = {module: total for module, _, total in reversed(entries)}
+        with open(path, 'w') as file:
+            file.write('cumulative [us]  startup module\n')
+            for module in IMPORT_MODULES:
+                file.write('{:15d}  {}\n'.format(cumulative.get(module, 0), module))
+            file.write('\n      self [us]  module\n')
+            for module, self_time, _ in sorted(entries, key=lambda entry: -entry[1])[:self.__top]:
+                file.write('{:15d}  {}\n'.format(self_time, module))
+        logger.info('Import times written to {}'.format(path))
+
+    def wrap(self, callback: Callable) -> Callable:
+        """
+        Wraps a handler callback, every n-th call is profiled.
+        Only one call is profiled at a time, Python 3.12 and later allow only one active profiler.
+
+        :param callback: Handler callback.
+        :return: Wrapped callback.
+        """
+
+        @wraps(callback)
+        def wrapper(*args: List, **kwargs: Dict):
+            if next(self.__calls) % self.__sample or not self.__profiling.acquire(blocking=False):
+                return callback(*args, **kwargs)
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(callback, *args, **kwargs)
+            finally:
+                self.__profiling.release()
+                with self.__lock:
+                    if self.__stats is None:
+                        self.__stats = pstats.Stats(profile)
+                    else:
+                        self.__stats.add(profile)
+
+        return wrapper
+
+    def dump(self) -> List[str]:
+        """
+        Writes the collected handler profiles and the top allocations.
+        The handler profiles are reset afterwards.
+
+        :return: List with paths of the written files.
+        """
+        paths = []
+        with self.__lock:
+            stats, self.__stats = self.__stats, None
+        try:
+            if stats is not None:
+                path = self.__path('handlers.pstats')
+                stats.dump_stats(path)
+                paths.append(path)
+                summary = io.StringIO()
+                stats.stream = summary
+                stats.sort_stats('cumulative').print_stats(self.__top)
+                path = self.__path('handlers.txt')
+                with open(path, 'w') as file:
+                    file.write(summary.getvalue())
+                paths.append(path)
+            if tracemalloc.is_tracing():
+                path = self.__path('tracemalloc.txt')
+                with open(path, 'w') as file:
+                    current, peak = tracemalloc.get_traced_memory()
+                    file.write('current: {} B, peak: {} B\n'.format(current, peak))
+                    for statistic in tracemalloc.take_snapshot().statistics('lineno')[:self.__top]:
+                        file.write('{}\n'.format(statistic))
+                paths.append(path)
+        except OSError as ex:
+            logger.error('Cannot write profile: {}'.format(ex))
+        logger.info('Profile written: {}'.format(', '.join(paths)))
+        return paths
+
+    def create_command(self, admins: List) -> Callable:
+        """
+        Creates the callback of the /profile command.
+
+        :param admins: List with user ids which are allowed to dump profiles.
+        :return: Command callback.
+        """
+        admins = frozenset(AccessManager.normalize_user_id(admin) for admin in admins)
+
+        def profile(update: Update, _: CallbackContext) -> None:
+            user_id = update.effective_user.id
+            if user_id not in admins:
+                logger.warning('Profiler: Access denied for {}'.format(user_id))
+                update.message.reply_text('Access denied for you ({})!'.format(user_id))
+                return
+            paths = self.dump()
+            update.message.reply_text('Profile written:\n{}'.format('\n'.join(paths)))
+
+        return profile
@@ -0,0 +1,144 @@
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Callable, Dict, List, Tuple
+
+from xvc_helper import XVCHelperBase
+
+# logging
+logger = logging.getLogger(__name__)
+
+# constants
+REPORT_DEADLINE = 5.0
+
+
+class ReportPart(object):
+    """
+    Simple class to describe one part of the diagnostics report.
+    """
+
+    def __init__(self, title: str, ttl: float, read: Callable[[XVCHelperBase], Tuple[bool, Dict[str, str]]]) -> None:
+        """
+        Initialize an object of class ReportPart.
+
+        :param title: Title of the part in the report.
+        :param ttl: Time in seconds a successful result is reused.
+        :param read: Function to read the part from the vacuum cleaner.
+        """
+        self.title = title
+        self.ttl = ttl
+        self.read = read
+
+
+REPORT_PARTS = [
+    ReportPart('Status', 5.0, lambda vacuum: vacuum.detailed_status()),
+    ReportPart('Consumables', 3600.0, lambda vacuum: vacuum.consumables()),
+    ReportPart('Clean summary', 300.0, lambda vacuum: vacuum.clean_summary()),
+    ReportPart('Do not disturb', 600.0, lambda vacuum: vacuum.dnd())
+]
+
+
+class ReportCollector(object):
+    """
+    Collects the diagnostics report from the vacuum cleaner.
+    Expired parts are read concurrently with a shared deadline, every part is cached with its own time to live.
+    The deadline starts with the collection, the executor must not block on submit.
+    """
+
+    def __init__(self, vacuum: XVCHelperBase, parts: List[ReportPart] = None,
+                 deadline: float = REPORT_DEADLINE, executor: Executor = None) -> None:
+        """
+        Initialize an object of class ReportCollector.
+
+        :param vacuum: Reference to vacuum cleaner.
+        :param parts: Parts of the report, default is REPORT_PARTS.
+        :param deadline: Maximum time in seconds to wait for all parts.
+        :param executor: Executor for the device calls, default is an own thread pool.
+        """
+        self.__vacuum = vacuum
+        self.__parts = parts if parts is not None else REPORT_PARTS
+        self.__deadline = deadline
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=len(self.__parts), thread_name_prefix='report')
+        self.__executor = executor
+        self.__cache = {}
+        self.__lock = Lock()
+
+    def __cached(self, part: ReportPart, now: float) -> Dict[str, str]:
+        """
+        Gets a cached result which is not expired.
+
+        :param part: Part of the report.
+        :param now: Current monotonic time.
+        :return: Cached result or None.
+        """
+        with self.__lock:
+            entry = self.__cache.get(part.title)
+        if entry is not None and now - entry[0] < part.ttl:
+            return entry[1]
+        return None
+
+    def __read(self, part: ReportPart) -> Tuple[bool, Dict[str, str]]:
+        """
+        Reads a part from the vacuum cleaner and caches successful results.
+
+        :param part: Part of the report.
+        :return: True on success, otherwise False.
+        :return: Dictionary with labels and values.
+        """
+        result, values = part.read(self.__vacuum)
+        if result:
+            with self.__lock:
+                self.__cache[part.title] = (time.monotonic(), values)
+        return result, values
+
+    def collect(self) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Collects all parts of the report.
+
+        :return: List with title and values of each part, values are None if the part could not be read.
+        """
+        now = time.monotonic()
+        results = {}
+        futures = {}
+        for part in self.__parts:
+            cached = self.__cached(part, now)
+            if cached is not None:
+                results[part.title] = cached
+            else:
+                futures[self.__executor.submit(self.__read, part)] = part
+
+        if futures:
+            done, not_done = wait(futures, timeout=max(self.__deadline - (time.monotonic() - now), 0))
+            for future in done:
+                part = futures[future]
+                try:
+                    result, values = future.result()
+                except Exception as ex:
+                    logger.error('Report part "{}" failed: {}'.format(part.title, ex))
+                    result, values = False, None
+                results[part.title] = values if result else None
+            for future in not_done:
+                # a queued read must not occupy a device worker after the deadline
+                future.cancel()
+                logger.warning('Report part "{}" missed the deadline'.format(futures[future].title))
+
+        return [(part.title, results.get(part.title)) for part in self.__parts]
+
+    @staticmethod
+    def render(report: List[Tuple[str, Dict[str, str]]]) -> str:
+        """
+        Renders the report as one message.
+
+        :param report: List with title and values of each part.
+        :return: Message text.
+        """
+        lines = []
+        for title, values in report:
+            lines.append(title)
+            if values is None:
+                lines.append('  not available')
+            else:
+                lines.extend('  {}: {}'.format(label, value) for label, value in values.items())
+        return '\n'.join(lines)